@@ -1,16 +1,60 @@
+import codecs
 import copy
+import gzip
+import itertools
 import logging
+import os
+import Queue
+import random
+import socket
+import sys
+import threading
+import time
+import weakref
+from collections import namedtuple
+from contextlib import contextmanager
+from cStringIO import StringIO
 from datetime import datetime
+from fnmatch import fnmatchcase
 from operator import itemgetter
-
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk_index
+from urllib import urlencode
+
+import urllib3
+from elasticsearch import (
+    ConnectionSelector, Elasticsearch, MemcachedConnection,
+    RequestsHttpConnection, ThriftConnection, Transport,
+    Urllib3HttpConnection)
+from elasticsearch.connection_pool import RandomSelector, RoundRobinSelector
+from elasticsearch.client.utils import _make_path
+from elasticsearch.exceptions import (
+    ConnectionError, NotFoundError, TransportError)
+from elasticsearch.helpers import BulkIndexError, expand_action
 
 from elasticutils._version import __version__  # noqa
+from elasticutils.utils import iter_search_hits
 
 
 log = logging.getLogger('elasticutils')
 
+# Elasticsearch objects for clusters that don't support terminate_after.
+_terminate_after_unsupported = weakref.WeakKeyDictionary()
+
+
+def _rejects_terminate_after(exc):
+    """Returns whether exc is a search failing over terminate_after
+
+    Clusters that don't know ``terminate_after`` fail to parse the
+    search and say so. Anything else, like a missing index or a
+    timeout, has nothing to do with it.
+
+    """
+    if isinstance(exc, ConnectionError):
+        return False
+    # The error message and, if there is one, the response body.
+    text = u' '.join(unicode(arg) for arg in exc.args[1:])
+    return ((exc.status_code == 400 or 'Parse' in text) and
+            'terminate_after' in text)
+
 
 # Note: Don't change these--they're not part of the API.
 DEFAULT_URLS = ['localhost']
@@ -18,6 +62,9 @@ DEFAULT_DOCTYPES = None
 DEFAULT_INDEXES = None
 DEFAULT_TIMEOUT = 5
 
+#: Number of bytes read at a time when parsing responses incrementally.
+STREAM_CHUNK_SIZE = 64 * 1024
+
 
 #: Maps ElasticUtils field actions to their Elasticsearch query names.
 QUERY_ACTION_MAP = {
@@ -66,13 +113,849 @@ class BadSearch(ElasticUtilsError):
     pass
 
 
+class DeadlineExceeded(ElasticUtilsError):
+    """Raised when a request to Elasticsearch would go past the deadline
+
+    See :py:func:`elasticutils.deadline`.
+
+    """
+    pass
+
+
+_deadline = threading.local()
+
+
+@contextmanager
+def deadline(seconds):
+    """Context manager that gives the code in it a time budget
+
+    Requests to Elasticsearch made in the with block by this thread
+    get the time that's left as their HTTP timeout. Searches also pass
+    it to Elasticsearch as the ``timeout`` so shards stop searching
+    and return what they have when it runs out. Once the time is up,
+    requests raise :py:class:`elasticutils.DeadlineExceeded` without
+    going to Elasticsearch.
+
+    Nested deadlines can only make the budget shorter.
+
+    :arg seconds: the budget in seconds
+
+    Example::
+
+        with deadline(0.3):
+            results = list(S().query(title__match='firefox')[:10])
+            count = S().filter(product='firefox').count()
+
+    """
+    outer = getattr(_deadline, 'expires', None)
+    expires = time.time() + seconds
+    if outer is not None:
+        expires = min(expires, outer)
+
+    _deadline.expires = expires
+    try:
+        yield
+    finally:
+        _deadline.expires = outer
+
+
+def get_remaining_time():
+    """Returns the seconds left before the deadline
+
+    :returns: seconds left or None if there's no deadline
+
+    :raises DeadlineExceeded: if there's no time left
+
+    """
+    expires = getattr(_deadline, 'expires', None)
+    if expires is None:
+        return None
+    remaining = expires - time.time()
+    if remaining <= 0:
+        raise DeadlineExceeded('Deadline exceeded by {0:.3f}s'.format(
+            -remaining))
+    return remaining
+
+
+def _es_timeout(remaining):
+    """Returns the Elasticsearch timeout value for a number of seconds"""
+    return '{0}ms'.format(max(int(remaining * 1000), 1))
+
+
+class HttpConnection(Urllib3HttpConnection):
+    """urllib3 connection with pool settings and usage counters
+
+    This is the connection class :py:func:`elasticutils.get_es` uses
+    by default. On top of what ``Urllib3HttpConnection`` does, it
+    takes:
+
+    :arg maxsize: the most connections to keep open to this host;
+        defaults to 10
+    :arg block: if True, requests wait for a free connection when
+        there are already `maxsize` in use rather than opening a new
+        one that's thrown away afterwards; defaults to False
+    :arg keep_alive: if True, asks the server to keep connections
+        open and turns on TCP keep-alive for them; if False, closes
+        connections after each request; defaults to True
+    :arg compress: if True, gzips request bodies of at least
+        `compress_threshold` bytes and asks for gzipped responses;
+        defaults to False
+    :arg compress_level: gzip compression level from 1 (fastest) to 9
+        (smallest); defaults to 6
+    :arg compress_threshold: smallest request body in bytes that gets
+        gzipped; defaults to 1024
+
+    .. Note::
+
+       Elasticsearch only gzips responses if ``http.compression`` is
+       turned on in its configuration.
+
+    Inside :py:func:`elasticutils.deadline`, the time that's left is
+    the timeout for requests.
+
+    It keeps counts of requests, failed requests and requests in
+    flight. See :py:func:`elasticutils.get_pool_stats`. It also keeps
+    moving averages of how long requests take and how often the node
+    fails (connection errors and 502, 503 and 504 responses) for
+    :py:class:`elasticutils.LatencySelector`.
+
+    """
+    #: Weight of the latest request in the moving averages.
+    decay = 0.2
+
+    def __init__(self, host='localhost', port=9200, http_auth=None,
+                 use_ssl=False, maxsize=10, block=False, keep_alive=True,
+                 compress=False, compress_level=6, compress_threshold=1024,
+                 **kwargs):
+        super(HttpConnection, self).__init__(
+            host=host, port=port, http_auth=http_auth, use_ssl=use_ssl,
+            maxsize=maxsize, **kwargs)
+        self.maxsize = maxsize
+        self.keep_alive = keep_alive
+        self.compress = compress
+        self.compress_level = compress_level
+        self.compress_threshold = compress_threshold
+        self.pool.block = block
+
+        if compress:
+            # urllib3 decompresses responses for us.
+            self.pool.headers['Accept-Encoding'] = 'gzip'
+
+        if keep_alive:
+            self.pool.headers['Connection'] = 'keep-alive'
+            conn_kw = getattr(self.pool, 'conn_kw', None)
+            if conn_kw is not None and hasattr(socket, 'SO_KEEPALIVE'):
+                # Keeps idle connections from being dropped silently
+                # by firewalls and load balancers.
+                conn_kw['socket_options'] = (
+                    list(urllib3.connection.HTTPConnection
+                         .default_socket_options) +
+                    [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)])
+        else:
+            self.pool.headers['Connection'] = 'close'
+
+        self._counter_lock = threading.Lock()
+        self.num_requests = 0
+        self.num_errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Forgets the latency and error rate averages"""
+        #: Moving average of request time in seconds; None until
+        #: there's been a request.
+        self.latency = None
+        #: Moving average of the fraction of requests that failed.
+        self.error_rate = 0.0
+        #: How many requests the averages are based on.
+        self.samples = 0
+
+    def perform_request(self, method, url, params=None, body=None,
+                        timeout=None, ignore=()):
+        return self._counted(self._perform_request, method, url, params,
+                             body, timeout, ignore)
+
+    def perform_stream_request(self, method, url, params=None, body=None,
+                               timeout=None, chunk_size=STREAM_CHUNK_SIZE):
+        """Performs a request and returns the body as unicode chunks
+
+        This is :py:meth:`perform_request` except that it returns as
+        soon as the response headers are in and hands back an
+        iterator over the response body instead of the whole of it.
+        Error responses raise the same exceptions.
+
+        The counters and averages count the time until the response
+        starts.
+
+        :arg chunk_size: how many bytes to read from the response at a
+            time
+
+        """
+        return self._counted(self._perform_stream_request, method, url,
+                             params, body, timeout, chunk_size)
+
+    def _counted(self, perform, method, url, params, body, timeout, *args):
+        """Calls perform, keeping the counters and averages
+
+        This also caps the timeout at the time that's left inside
+        :py:func:`elasticutils.deadline`.
+
+        """
+        remaining = get_remaining_time()
+        if remaining is not None:
+            timeout = min(timeout or remaining, remaining)
+
+        with self._counter_lock:
+            self.num_requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        start = time.time()
+        failed = False
+        try:
+            return perform(method, url, params, body, timeout, *args)
+        except ConnectionError:
+            if remaining is not None:
+                # If we ran out of time, that's not the node's fault,
+                # so don't let the transport mark it dead.
+                get_remaining_time()
+            failed = True
+            with self._counter_lock:
+                self.num_errors += 1
+            raise
+        except Exception as exc:
+            failed = _is_node_failure(exc)
+            with self._counter_lock:
+                self.num_errors += 1
+            raise
+        finally:
+            self._record(time.time() - start, failed)
+
+    def prepare_body(self, body):
+        """Returns the body to send and the headers to send it with
+
+        :arg body: the body as a str or unicode or None
+
+        :returns: ``(body, headers)``; headers is None for the pool's
+            default headers
+
+        """
+        if not self.compress or body is None:
+            return body, None
+
+        if isinstance(body, unicode):
+            body = body.encode('utf-8')
+        if len(body) < self.compress_threshold:
+            return body, None
+
+        buf = StringIO()
+        gz = gzip.GzipFile(
+            fileobj=buf, mode='wb', compresslevel=self.compress_level)
+        gz.write(body)
+        gz.close()
+
+        headers = dict(self.pool.headers)
+        headers['Content-Encoding'] = 'gzip'
+        return buf.getvalue(), headers
+
+    def _urlopen(self, method, url, params, body, timeout, **kw):
+        """Sends a request through the pool
+
+        :returns: ``(response, url, full_url, start)``
+
+        """
+        url = self.url_prefix + url
+        if params:
+            url = '%s?%s' % (url, urlencode(params))
+        full_url = self.host + url
+
+        data, headers = self.prepare_body(body)
+        if timeout:
+            kw['timeout'] = timeout
+        if headers is not None:
+            kw['headers'] = headers
+
+        start = time.time()
+        try:
+            response = self.pool.urlopen(method, url, data, **kw)
+        except Exception as exc:
+            self.log_request_fail(method, full_url, body,
+                                  time.time() - start, exception=exc)
+            raise ConnectionError('N/A', str(exc), exc)
+        return response, url, full_url, start
+
+    def _perform_request(self, method, url, params, body, timeout, ignore):
+        # This is Urllib3HttpConnection.perform_request with request
+        # body compression.
+        response, url, full_url, start = self._urlopen(
+            method, url, params, body, timeout)
+        try:
+            raw_data = response.data.decode('utf-8')
+        except Exception as exc:
+            self.log_request_fail(method, full_url, body,
+                                  time.time() - start, exception=exc)
+            raise ConnectionError('N/A', str(exc), exc)
+        duration = time.time() - start
+
+        if (not (200 <= response.status < 300) and
+                response.status not in ignore):
+            self.log_request_fail(method, url, body, duration,
+                                  response.status)
+            self._raise_error(response.status, raw_data)
+
+        self.log_request_success(method, full_url, url, body,
+                                 response.status, raw_data, duration)
+
+        return response.status, response.getheaders(), raw_data
+
+    def _perform_stream_request(self, method, url, params, body, timeout,
+                                chunk_size):
+        response, url, full_url, start = self._urlopen(
+            method, url, params, body, timeout, preload_content=False)
+        duration = time.time() - start
+
+        if not (200 <= response.status < 300):
+            try:
+                raw_data = response.data.decode('utf-8')
+            finally:
+                response.release_conn()
+            self.log_request_fail(method, url, body, duration,
+                                  response.status)
+            self._raise_error(response.status, raw_data)
+
+        # The body hasn't been read yet, so it isn't logged.
+        self.log_request_success(method, full_url, url, body,
+                                 response.status, None, duration)
+
+        return _iter_response_text(response, chunk_size)
+
+    def _record(self, duration, failed):
+        """Updates the counters and averages when a request is done"""
+        with self._counter_lock:
+            self.in_flight -= 1
+            self.samples += 1
+            if self.latency is None:
+                self.latency = duration
+            else:
+                self.latency += self.decay * (duration - self.latency)
+            self.error_rate += self.decay * (
+                (1.0 if failed else 0.0) - self.error_rate)
+
+
+#: Statuses that say a node or the cluster is in trouble. Other 5xx
+#: responses are left out: Elasticsearch 0.90 answers a query it can't
+#: parse with a 500 SearchPhaseExecutionException, and that's the
+#: query's fault.
+NODE_FAILURE_STATUSES = (502, 503, 504)
+
+
+def _is_node_failure(exc):
+    """Returns whether an exception says something's wrong with the node"""
+    if isinstance(exc, ConnectionError):
+        return True
+    return getattr(exc, 'status_code', None) in NODE_FAILURE_STATUSES
+
+
+class LatencySelector(ConnectionSelector):
+    """Picks connections to nodes that have been fast and healthy
+
+    Pass this as the ``selector_class`` setting to
+    :py:func:`elasticutils.get_es`. It works with the moving averages
+    :py:class:`elasticutils.HttpConnection` keeps.
+
+    Nodes with an error rate over `max_error_rate` or an average
+    latency more than `slow_factor` times the fastest node's and over
+    `min_eject_latency` are ejected for `eject_timeout` seconds. When
+    they come back, their averages start over. Of the rest, it picks
+    the faster of two at random, so the load is spread over the fast
+    nodes rather than piled on the fastest one. Nodes with fewer than
+    `min_samples` requests behind their averages count as fast and
+    aren't ejected, so one slow request doesn't get a node ejected.
+
+    If every node is ejected, it picks from all of them anyway.
+
+    Subclass it to change the settings.
+
+    """
+    #: Nodes this many times slower than the fastest get ejected.
+    slow_factor = 3.0
+    #: Nodes with more than this fraction of failures get ejected.
+    max_error_rate = 0.5
+    #: Seconds an ejected node is left alone.
+    eject_timeout = 30
+    #: Nodes faster than this many seconds are never ejected for being
+    #: slow, so jitter between fast nodes doesn't matter.
+    min_eject_latency = 0.1
+    #: Requests a node's averages need to be based on before it can be
+    #: ejected.
+    min_samples = 10
+
+    def __init__(self, opts):
+        super(LatencySelector, self).__init__(opts)
+        self._lock = threading.Lock()
+        # connection -> time it can be used again
+        self.ejected = {}
+
+    def select(self, connections):
+        now = time.time()
+        with self._lock:
+            for connection, until in self.ejected.items():
+                if until <= now:
+                    del self.ejected[connection]
+                    if hasattr(connection, 'reset_stats'):
+                        connection.reset_stats()
+
+            healthy = []
+            for connection in connections:
+                if connection in self.ejected:
+                    continue
+                if (self._is_known(connection) and
+                        connection.error_rate > self.max_error_rate):
+                    self._eject(connection, now)
+                else:
+                    healthy.append(connection)
+
+            known = [c.latency for c in healthy if self._is_known(c)]
+            cutoff = max(min(known) * self.slow_factor if known else 0,
+                         self.min_eject_latency)
+
+            candidates = []
+            for connection in healthy:
+                if self._is_known(connection) and connection.latency > cutoff:
+                    self._eject(connection, now)
+                else:
+                    candidates.append(connection)
+
+        if not candidates:
+            candidates = connections
+        if len(candidates) == 1:
+            return candidates[0]
+        return min(random.sample(candidates, 2), key=self._latency)
+
+    def _is_known(self, connection):
+        """Returns whether there's enough to go on to eject connection"""
+        return (getattr(connection, 'latency', None) is not None and
+                getattr(connection, 'samples', 0) >= self.min_samples)
+
+    def _eject(self, connection, now):
+        log.info('Ejecting %s for %ss', connection, self.eject_timeout)
+        self.ejected[connection] = now + self.eject_timeout
+
+    def _latency(self, connection):
+        latency = getattr(connection, 'latency', None)
+        return 0 if latency is None else latency
+
+
+#: Names that can be used for the ``selector_class`` setting of
+#: :py:func:`elasticutils.get_es`.
+SELECTOR_CLASSES = {
+    'latency': LatencySelector,
+    'round_robin': RoundRobinSelector,
+    'random': RandomSelector,
+}
+
+
+class Sniffer(threading.Thread):
+    """Thread that refreshes the node list of a transport now and then
+
+    elasticsearch-py's ``sniffer_timeout`` sniffs in the middle of a
+    request. This does it in the background instead. It stops when the
+    transport goes away.
+
+    :arg transport: the `Transport` to sniff the nodes for
+    :arg interval: seconds between sniffs
+
+    """
+    def __init__(self, transport, interval):
+        super(Sniffer, self).__init__(name='elasticutils-sniffer')
+        self.daemon = True
+        self.transport_ref = weakref.ref(transport)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while True:
+            self.stopped.wait(self.interval)
+            if self.stopped.is_set() or not self.sniff():
+                return
+
+    def sniff(self):
+        """Sniffs once
+
+        :returns: False if the transport is gone
+
+        """
+        # This holds the transport until it returns, so the transport
+        # isn't kept alive while waiting.
+        transport = self.transport_ref()
+        if transport is None:
+            return False
+        try:
+            transport.sniff_hosts()
+        except Exception:
+            log.warning('Sniffing Elasticsearch nodes failed',
+                        exc_info=True)
+        return True
+
+    def stop(self):
+        """Stops the thread after the current sniff"""
+        self.stopped.set()
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of making a request when the circuit breaker is open
+
+    This is an elasticsearch-py ``ConnectionError``, so code that
+    handles the cluster being down handles this, too.
+
+    """
+
+
+class CircuitBreaker(object):
+    """Stops requests to a cluster for a while after it keeps failing
+
+    The breaker starts out closed and lets requests through. After
+    `failure_threshold` requests in a row fail with connection errors
+    or 502, 503 or 504 responses, it opens and requests fail right away with
+    `CircuitOpenError` for `reset_timeout` seconds. Then it's
+    half-open: it lets one request through to see if the cluster is
+    back. If that works, the breaker closes; if not, it opens again.
+
+    It's safe to share between threads. Use
+    :py:func:`elasticutils.get_circuit_breaker` to get the breaker
+    shared by all the `Elasticsearch` objects for a cluster.
+
+    :arg failure_threshold: failures in a row that open the breaker
+    :arg reset_timeout: seconds the breaker stays open
+
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        # Whether the half-open probe request is going on.
+        self._probing = False
+
+    def __repr__(self):
+        return '<CircuitBreaker {0}>'.format(self.state)
+
+    def is_open(self):
+        """Returns whether requests are being failed right now
+
+        Unlike `allow_request()`, this doesn't start a probe.
+
+        """
+        if self.state == self.CLOSED:
+            return False
+        if self.state == self.OPEN:
+            return time.time() - self.opened_at < self.reset_timeout
+        return self._probing
+
+    def allow_request(self):
+        """Returns whether a request can go ahead
+
+        In the half-open state, this lets the probe request through
+        and the caller has to tell the breaker how it went with
+        `record_success()` or `record_failure()`.
+
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.time() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        """Records that a request worked and closes the breaker"""
+        with self._lock:
+            if self.state != self.CLOSED:
+                log.info('Elasticsearch circuit breaker closed')
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """Records that a request failed and opens the breaker if it
+        has failed too often"""
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if (self.state == self.HALF_OPEN or
+                    self.failures >= self.failure_threshold):
+                if self.state != self.OPEN:
+                    log.warning('Elasticsearch circuit breaker opened')
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+    def _end_probe(self):
+        """Ends a probe without saying how the cluster is doing"""
+        with self._lock:
+            self._probing = False
+
+    def call(self, fun, *args, **kwargs):
+        """Calls fun if the breaker allows and records how it went
+
+        :raises CircuitOpenError: if the breaker is open
+
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(
+                'N/A', 'Circuit breaker is open; not trying Elasticsearch',
+                None)
+        try:
+            result = fun(*args, **kwargs)
+        except DeadlineExceeded:
+            self._end_probe()
+            raise
+        except Exception as exc:
+            if _is_node_failure(exc):
+                self.record_failure()
+            else:
+                # The cluster answered.
+                self.record_success()
+            raise
+        except BaseException:
+            self._end_probe()
+            raise
+        self.record_success()
+        return result
+
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(urls=None, **kwargs):
+    """Returns the circuit breaker for a cluster
+
+    All calls with the same `urls` get the same
+    :py:class:`elasticutils.CircuitBreaker`.
+
+    :arg urls: the urls passed to :py:func:`elasticutils.get_es`
+    :arg kwargs: arguments for the `CircuitBreaker` if it doesn't
+        exist yet
+
+    """
+    urls = urls or DEFAULT_URLS
+    if isinstance(urls, basestring):
+        urls = (urls,)
+    else:
+        urls = tuple(urls)
+
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(urls)
+        if breaker is None:
+            breaker = _circuit_breakers[urls] = CircuitBreaker(**kwargs)
+        return breaker
+
+
+class CircuitBreakerTransport(Transport):
+    """Transport that sends requests through a circuit breaker
+
+    :arg circuit_breaker: the :py:class:`elasticutils.CircuitBreaker`
+        to use
+
+    """
+    def __init__(self, hosts, circuit_breaker=None, **kwargs):
+        super(CircuitBreakerTransport, self).__init__(hosts, **kwargs)
+        self.circuit_breaker = circuit_breaker
+
+    def perform_request(self, method, url, params=None, body=None):
+        perform_request = super(
+            CircuitBreakerTransport, self).perform_request
+        if self.circuit_breaker is None:
+            return perform_request(method, url, params, body)
+        return self.circuit_breaker.call(
+            perform_request, method, url, params, body)
+
+
+#: Names that can be used for the ``connection_class`` setting of
+#: :py:func:`elasticutils.get_es`.
+CONNECTION_CLASSES = {
+    'urllib3': HttpConnection,
+    'requests': RequestsHttpConnection,
+    'thrift': ThriftConnection,
+    'memcached': MemcachedConnection,
+}
+
+
+def _get_class(cls, names):
+    """Returns the class for a name, dotted path or class
+
+    :arg cls: the class, a key in `names` or a dotted path
+    :arg names: dict of name -> class
+
+    """
+    if not isinstance(cls, basestring):
+        return cls
+    if cls in names:
+        return names[cls]
+
+    module_name, _, class_name = cls.rpartition('.')
+    if not module_name:
+        raise ValueError('Unknown class "{0}"'.format(cls))
+    module = __import__(module_name, {}, {}, [class_name])
+    return getattr(module, class_name)
+
+
+def get_pool_stats(es):
+    """Returns connection pool usage for each host of an Elasticsearch
+
+    :arg es: `Elasticsearch` object
+
+    :returns: list of dicts, one per host, with these keys:
+
+        * ``host``: the host url
+        * ``maxsize``: the most connections kept open to the host
+        * ``idle``: open connections waiting to be used
+        * ``connections_created``: connections opened so far; if this
+          keeps going up, the pool is too small
+        * ``requests``: requests made
+        * ``errors``: requests that failed
+        * ``in_flight``: requests going on right now
+        * ``max_in_flight``: the most requests that went on at once
+        * ``latency``: moving average of request time in seconds
+        * ``error_rate``: moving average of the fraction of requests
+          that failed
+
+        Counts a connection class doesn't keep are None.
+        ``in_flight`` and the rest are only kept by
+        :py:class:`elasticutils.HttpConnection`.
+
+    Example::
+
+        for stats in get_pool_stats(get_es()):
+            if stats['max_in_flight'] >= stats['maxsize']:
+                log.warning('Pool for %s is full', stats['host'])
+
+    """
+    all_stats = []
+    # connection_opts has the dead connections as well as the live ones.
+    for connection, opts in es.transport.connection_pool.connection_opts:
+        pool = getattr(connection, 'pool', None)
+        stats = {
+            'host': connection.host,
+            'maxsize': None,
+            'idle': None,
+            'connections_created': None,
+            'requests': getattr(connection, 'num_requests', None),
+            'errors': getattr(connection, 'num_errors', None),
+            'in_flight': getattr(connection, 'in_flight', None),
+            'max_in_flight': getattr(connection, 'max_in_flight', None),
+            'latency': getattr(connection, 'latency', None),
+            'error_rate': getattr(connection, 'error_rate', None),
+        }
+        if isinstance(pool, urllib3.HTTPConnectionPool):
+            # Empty slots in the pool's queue are Nones.
+            stats['maxsize'] = pool.pool.maxsize
+            stats['idle'] = len(
+                [conn for conn in list(pool.pool.queue) if conn is not None])
+            stats['connections_created'] = pool.num_connections
+            if stats['requests'] is None:
+                stats['requests'] = pool.num_requests
+        all_stats.append(stats)
+    return all_stats
+
+
+def warm_up(es=None, connections=1, queries=()):
+    """Opens connections and runs searches ahead of time
+
+    The first requests a process makes otherwise pay for DNS lookups,
+    TCP and TLS handshakes and cold caches on the Elasticsearch nodes.
+    Call this when a web or task worker starts.
+
+    :arg es: the `Elasticsearch` to warm up; defaults to ``get_es()``
+    :arg connections: how many connections to open to each host; at
+        most the pool size
+    :arg queries: `S` objects to run to warm up caches on the nodes
+
+    :returns: the number of connections opened
+
+    Errors are logged rather than raised, so a worker still starts
+    when Elasticsearch is down.
+
+    Example::
+
+        warm_up(get_es(maxsize=20), connections=20,
+                queries=[S().indexes('blog').query(title__match='test')])
+
+    """
+    if es is None:
+        es = get_es()
+
+    opened = 0
+    for connection, opts in es.transport.connection_pool.connection_opts:
+        pool = getattr(connection, 'pool', None)
+        try:
+            if isinstance(pool, urllib3.HTTPConnectionPool):
+                opened += _open_connections(
+                    pool, min(connections, pool.pool.maxsize))
+            else:
+                connection.perform_request('HEAD', '/')
+                opened += 1
+        except Exception as exc:
+            log.warning('Unable to connect to {0}: {1}'.format(
+                connection.host, repr(exc)))
+
+    for s in queries:
+        try:
+            s.execute()
+        except Exception as exc:
+            log.warning('Unable to run warm-up query {0}: {1}'.format(
+                s, repr(exc)))
+
+    return opened
+
+
+def _open_connections(pool, count):
+    """Makes sure count connections in a urllib3 pool are connected
+
+    :returns: the number of connections opened
+
+    """
+    conns = []
+    opened = 0
+    try:
+        for i in range(count):
+            try:
+                conn = pool._get_conn(timeout=0)
+            except urllib3.exceptions.EmptyPoolError:
+                # The rest are being used, so they're connected.
+                break
+            conns.append(conn)
+            if conn.sock is None:
+                conn.connect()
+                opened += 1
+    finally:
+        for conn in conns:
+            pool._put_conn(conn)
+    return opened
+
+
 def _build_key(urls, timeout, **settings):
-    # Order the settings by key and then turn it into a string with
-    # repr. There are a lot of edge cases here, but the worst that
-    # happens is that the key is different and so you get a new
-    # Elasticsearch. We'll probably have to tweak this.
-    settings = sorted(settings.items(), key=lambda item: item[0])
-    settings = repr([(k, v) for k, v in settings])
+    # A frozenset of the items is cheap and doesn't care about order.
+    # Settings with values that can't be hashed (lists, dicts, ...)
+    # get ordered by key and turned into a string with repr instead.
+    # There are a lot of edge cases there, but the worst that happens
+    # is that the key is different and so you get a new
+    # Elasticsearch.
+    try:
+        settings = frozenset(settings.iteritems())
+    except TypeError:
+        settings = repr(sorted(settings.items(), key=lambda item: item[0]))
 
     # elasticsearch allows urls to be a string, so we make sure to
     # account for that when converting whatever it is into a tuple.
@@ -87,7 +970,127 @@ def _build_key(urls, timeout, **settings):
     return key
 
 
+#: Most Elasticsearch objects get_es() keeps around. When there are
+#: more, the oldest ones get dropped.
+ES_CACHE_SIZE = 32
+
 _cached_elasticsearch = {}
+# key -> number saying when it was added, for dropping the oldest
+_cached_elasticsearch_order = {}
+_cached_elasticsearch_counter = itertools.count()
+_cached_elasticsearch_lock = threading.Lock()
+_cached_elasticsearch_pid = os.getpid()
+# Goes up with every evict_es() call, so S objects drop theirs too.
+_cached_elasticsearch_generation = 0
+
+
+#: Connections per host get_es() keeps in cooperative mode unless
+#: ``maxsize`` is passed. Greenlets are cheap, so there tend to be
+#: more of them than threads making requests at once.
+COOPERATIVE_POOL_MAXSIZE = 50
+
+
+def _get_hub():
+    """Returns the gevent or eventlet hub for this thread or None
+
+    There's only a hub if gevent or eventlet has patched ``socket``;
+    otherwise requests block every greenlet anyway.
+
+    """
+    gevent_monkey = sys.modules.get('gevent.monkey')
+    if (gevent_monkey is not None and
+            gevent_monkey.is_module_patched('socket')):
+        return sys.modules['gevent'].get_hub()
+
+    eventlet_patcher = sys.modules.get('eventlet.patcher')
+    if (eventlet_patcher is not None and
+            eventlet_patcher.is_monkey_patched('socket')):
+        return sys.modules['eventlet.hubs'].get_hub()
+
+    return None
+
+
+def _get_owner():
+    """Returns what an Elasticsearch object can be shared within
+
+    That's the process and, in cooperative mode, the hub, since
+    sockets can't be shared across processes or hubs. It changes
+    when :py:func:`elasticutils.evict_es` is called, too.
+
+    """
+    return os.getpid(), _get_hub(), _cached_elasticsearch_generation
+
+
+def _check_pid():
+    """Empties the Elasticsearch cache if we're in a forked process
+
+    Elasticsearch objects created before a fork share their pooled
+    sockets with the parent, so the child builds its own.
+
+    """
+    global _cached_elasticsearch_lock, _cached_elasticsearch_pid
+
+    pid = os.getpid()
+    if pid != _cached_elasticsearch_pid:
+        # The lock might have been held by a thread that doesn't exist
+        # in this process.
+        _cached_elasticsearch_lock = threading.Lock()
+        _cached_elasticsearch.clear()
+        _cached_elasticsearch_order.clear()
+        _cached_elasticsearch_pid = pid
+
+
+def _cache_es(key, es):
+    """Caches es under key, dropping the oldest if the cache is full
+
+    Call this with the cache lock held.
+
+    """
+    if len(_cached_elasticsearch) >= ES_CACHE_SIZE:
+        for stale in [k for k in _cached_elasticsearch_order
+                      if k not in _cached_elasticsearch]:
+            del _cached_elasticsearch_order[stale]
+        while _cached_elasticsearch and (
+                len(_cached_elasticsearch) >= ES_CACHE_SIZE):
+            oldest = min(_cached_elasticsearch,
+                         key=lambda k: _cached_elasticsearch_order.get(k, -1))
+            del _cached_elasticsearch[oldest]
+            _cached_elasticsearch_order.pop(oldest, None)
+
+    _cached_elasticsearch[key] = es
+    _cached_elasticsearch_order[key] = next(_cached_elasticsearch_counter)
+
+
+def evict_es(es=None):
+    """Removes Elasticsearch objects from the get_es() cache
+
+    :arg es: the `Elasticsearch` object to remove; if None, removes
+        all of them
+
+    S objects that have an `Elasticsearch` stored get a new one from
+    `get_es()` the next time they need one.
+
+    Example::
+
+        # Drop a client that's gone bad so the next get_es() call
+        # builds a new one.
+        evict_es(es)
+
+    """
+    global _cached_elasticsearch_generation
+
+    _check_pid()
+    with _cached_elasticsearch_lock:
+        _cached_elasticsearch_generation += 1
+        if es is None:
+            _cached_elasticsearch.clear()
+            _cached_elasticsearch_order.clear()
+            return
+
+        for key, value in _cached_elasticsearch.items():
+            if value is es:
+                del _cached_elasticsearch[key]
+                _cached_elasticsearch_order.pop(key, None)
 
 
 def get_es(urls=None, timeout=DEFAULT_TIMEOUT, force_new=False, **settings):
@@ -104,6 +1107,14 @@ def get_es(urls=None, timeout=DEFAULT_TIMEOUT, force_new=False, **settings):
     4. if you pass in `force_new=True`, then you are guaranteed to get
        a fresh `Elasticsearch` object AND that object will not be
        cached
+    5. the cache holds at most `ES_CACHE_SIZE` objects and drops the
+       oldest when it's full; `evict_es()` removes objects from it
+    6. a process forked after `Elasticsearch` objects were cached
+       gets new ones rather than sharing the parent's connections
+    7. in cooperative mode, each gevent or eventlet hub gets its own
+       `Elasticsearch` objects
+
+    This is safe to call from multiple threads and greenlets.
 
     :arg urls: list of uris; Elasticsearch hosts to connect to,
         defaults to ``['http://localhost:9200']``
@@ -114,6 +1125,46 @@ def get_es(urls=None, timeout=DEFAULT_TIMEOUT, force_new=False, **settings):
         constructor; See
         `<http://elasticsearch.readthedocs.org/>`_ for more details.
 
+        These control the connections to each host:
+
+        * ``connection_class``: the connection class or one of the
+          names in `CONNECTION_CLASSES` or a dotted path to a class;
+          defaults to :py:class:`elasticutils.HttpConnection`
+        * ``maxsize``: the most connections to keep open to each host
+        * ``block``: whether to wait for a free connection rather than
+          open a new one when `maxsize` are in use
+        * ``keep_alive``: whether to keep connections open between
+          requests
+        * ``compress``, ``compress_level``, ``compress_threshold``:
+          whether and how to gzip requests and responses
+
+        See :py:class:`elasticutils.HttpConnection` for details.
+
+        These control which nodes get used:
+
+        * ``selector_class``: the connection selector class or one of
+          the names in `SELECTOR_CLASSES` or a dotted path to a class;
+          ``'latency'`` picks :py:class:`elasticutils.LatencySelector`
+        * ``sniff_interval``: if set, a :py:class:`elasticutils.Sniffer`
+          thread gets the list of nodes from the cluster every this
+          many seconds
+
+        ``cooperative`` is for running under gevent or eventlet. If
+        it's True, connection pools are per hub, hold up to
+        `COOPERATIVE_POOL_MAXSIZE` connections and make greenlets wait
+        for a free connection rather than open more; pass ``maxsize``
+        and ``block`` to change that. It defaults to whether gevent or
+        eventlet has monkey-patched ``socket``. Passing True when
+        neither has raises a ValueError.
+
+        ``circuit_breaker`` makes requests fail right away for a while
+        when the cluster keeps failing. It's either True to use
+        ``get_circuit_breaker(urls)`` or a
+        :py:class:`elasticutils.CircuitBreaker`. It needs a
+        ``transport_class`` that takes a ``circuit_breaker`` argument
+        like :py:class:`elasticutils.CircuitBreakerTransport`, which
+        is the default.
+
     Examples::
 
         # Returns cached Elasticsearch object
@@ -127,6 +1178,21 @@ def get_es(urls=None, timeout=DEFAULT_TIMEOUT, force_new=False, **settings):
         es = get_es(urls=['localhost:9200'], timeout=10,
                     max_retries=3)
 
+        # 50 connections per host for lots of threads.
+        es = get_es(maxsize=50, block=True)
+
+        # Avoid slow nodes and keep the node list up to date.
+        es = get_es(selector_class='latency', sniff_interval=60)
+
+        # Fail fast when the cluster is down.
+        es = get_es(circuit_breaker=True)
+
+    .. Note::
+
+       Under gevent or eventlet, monkey-patch before importing
+       elasticutils. Otherwise its locks and thread locals, like the
+       one `deadline()` uses, are shared by all greenlets in a thread.
+
     """
     # Cheap way of de-None-ifying things
     urls = urls or DEFAULT_URLS
@@ -135,20 +1201,140 @@ def get_es(urls=None, timeout=DEFAULT_TIMEOUT, force_new=False, **settings):
     if 'hosts' in settings:
         raise DeprecationWarning('"hosts" is deprecated in favor of "urls".')
 
-    if not force_new:
-        key = _build_key(urls, timeout, **settings)
-        if key in _cached_elasticsearch:
-            return _cached_elasticsearch[key]
+    settings['connection_class'] = _get_class(
+        settings.get('connection_class', HttpConnection),
+        CONNECTION_CLASSES)
+    if 'selector_class' in settings:
+        settings['selector_class'] = _get_class(
+            settings['selector_class'], SELECTOR_CLASSES)
+
+    cooperative = settings.pop('cooperative', None)
+    hub = _get_hub() if cooperative is not False else None
+    if cooperative and hub is None:
+        raise ValueError(
+            'cooperative=True needs gevent or eventlet to have patched '
+            'socket')
+    if hub is not None and issubclass(
+            settings['connection_class'], HttpConnection):
+        settings.setdefault('maxsize', COOPERATIVE_POOL_MAXSIZE)
+        settings.setdefault('block', True)
+
+    if force_new:
+        return _create_es(urls, timeout, settings)
+
+    _check_pid()
+    key = _build_key(urls, timeout, **settings)
+    if hub is not None:
+        # Holding on to the hub rather than its id means a hub that
+        # goes away with its thread can't be mistaken for a new one.
+        key += (hub,)
+    es = _cached_elasticsearch.get(key)
+    if es is not None:
+        return es
+
+    with _cached_elasticsearch_lock:
+        # Another thread might have created it while we were waiting
+        # for the lock.
+        es = _cached_elasticsearch.get(key)
+        if es is None:
+            es = _create_es(urls, timeout, settings)
+            _cache_es(key, es)
+    return es
+
 
+def _create_es(urls, timeout, settings):
+    """Creates an Elasticsearch and starts its Sniffer if it has one"""
+    settings = dict(settings)
+    sniff_interval = settings.pop('sniff_interval', None)
+    breaker = settings.pop('circuit_breaker', None)
+    if breaker:
+        if breaker is True:
+            breaker = get_circuit_breaker(urls)
+        settings.setdefault('transport_class', CircuitBreakerTransport)
+        settings['circuit_breaker'] = breaker
     es = Elasticsearch(urls, timeout=timeout, **settings)
+    if sniff_interval:
+        es.transport.sniffer = Sniffer(es.transport, sniff_interval)
+        es.transport.sniffer.start()
+    return es
 
-    if not force_new:
-        # We don't need to rebuild the key here since we built it in
-        # the previous if block, so it's in the namespace. Having said
-        # that, this is a little ew.
-        _cached_elasticsearch[key] = es
 
-    return es
+def _iter_response_text(response, chunk_size):
+    """Yields the body of a urllib3 response as unicode chunks"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    done = False
+    try:
+        for chunk in response.stream(chunk_size):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode('', final=True)
+        if text:
+            yield text
+        done = True
+    finally:
+        if not done:
+            # Don't hand a connection with an unread body back to
+            # the pool.
+            response.close()
+        response.release_conn()
+
+
+def _open_stream(connection, method, url, params, body, chunk_size):
+    """Performs a request and returns the body as unicode chunks"""
+    perform_stream_request = getattr(
+        connection, 'perform_stream_request', None)
+    if perform_stream_request is None:
+        # Other connection classes hand over the whole body at once.
+        status, headers, data = connection.perform_request(
+            method, url, params, body)
+        return iter([data])
+
+    return perform_stream_request(
+        method, url, params, body, chunk_size=chunk_size)
+
+
+def _stream_request(es, method, url, params=None, body=None,
+                    chunk_size=STREAM_CHUNK_SIZE):
+    """Performs a request and returns the response body as unicode chunks
+
+    This picks a connection, retries and marks connections dead and
+    alive the same way the `Elasticsearch` transport does, but hands
+    back the response body a chunk at a time instead of deserializing
+    it.
+
+    """
+    transport = es.transport
+    if body is not None:
+        body = transport.serializer.dumps(body)
+        try:
+            body = body.encode('utf-8')
+        except UnicodeDecodeError:
+            # Already a str.
+            pass
+
+    breaker = getattr(transport, 'circuit_breaker', None)
+    if breaker is not None:
+        return breaker.call(_open_stream_with_retries, transport, method,
+                            url, params, body, chunk_size)
+    return _open_stream_with_retries(
+        transport, method, url, params, body, chunk_size)
+
+
+def _open_stream_with_retries(transport, method, url, params, body,
+                              chunk_size):
+    for attempt in range(transport.max_retries + 1):
+        connection = transport.get_connection()
+        try:
+            chunks = _open_stream(
+                connection, method, url, params, body, chunk_size)
+        except ConnectionError:
+            transport.mark_dead(connection)
+            if attempt == transport.max_retries:
+                raise
+        else:
+            transport.connection_pool.mark_live(connection)
+            return chunks
 
 
 def split_field_action(s):
@@ -492,8 +1678,12 @@ class S(PythonMixin):
         self.start = 0
         self.stop = None
         self.as_list = self.as_dict = False
+        self.source_filter = {}
+        self.fetch_deferred_fields = False
         self.field_boosts = {}
         self._results_cache = None
+        # (pid, Elasticsearch) once get_es() has been called
+        self._es = None
 
     def __repr__(self):
         try:
@@ -512,6 +1702,9 @@ class S(PythonMixin):
         new.start = self.start
         new.stop = self.stop
         new.field_boosts = self.field_boosts.copy()
+        if not next_step or next_step[0] != 'es':
+            # Same Elasticsearch settings, so the same Elasticsearch.
+            new._es = self._es
         return new
 
     def es(self, **settings):
@@ -550,6 +1743,46 @@ class S(PythonMixin):
         """
         return self._clone(next_step=('explain', value))
 
+    def stream(self, value=True):
+        """
+        Return a new S instance that parses the search response
+        incrementally.
+
+        Normally the whole response is decoded into one big dict and
+        then turned into results. With this set, hits are parsed one
+        at a time from the response body and turned into results as
+        they're parsed, so large responses don't need several copies
+        of themselves in memory.
+
+        .. Note::
+
+           The ``results`` property of the `SearchResults` is None
+           for streamed searches since the hits aren't kept around.
+
+        """
+        return self._clone(next_step=('stream', value))
+
+    def lean(self, value=True):
+        """
+        Return a new S instance whose results don't hang on to the raw
+        response.
+
+        Normally the `SearchResults` keeps the raw Elasticsearch
+        response and the list of hits around along with the results
+        themselves, and each result keeps the ``_source`` of its hit.
+        With this set, only ``took``, ``count``, ``facets`` and the
+        results are kept, which cuts down on the memory used by
+        results that are cached or kept around for a while.
+
+        .. Note::
+
+           The ``response`` and ``results`` properties of the
+           `SearchResults` and the ``_source`` of each result are
+           None for lean searches.
+
+        """
+        return self._clone(next_step=('lean', value))
+
     def values_list(self, *fields):
         """
         Return a new S instance that returns ListSearchResults.
@@ -565,7 +1798,7 @@ class S(PythonMixin):
         For example:
 
         >>> list(S().values_list())
-        [(1, 'fred', 40), (2, 'brian', 30), (3, 'james', 45)]
+        [(40, 1, 'fred'), (30, 2, 'brian'), (45, 3, 'james')]
         >>> list(S().values_list('id', 'name'))
         [(1, 'fred'), (2, 'brian'), (3, 'james')]
         >>> list(S().values_list('name', 'id'))
@@ -573,9 +1806,10 @@ class S(PythonMixin):
 
         .. Note::
 
-           If you don't specify fields, the data comes back in an
-           arbitrary order. It's probably best to specify fields or
-           use ``values_dict``.
+           If you don't specify fields, the values are ordered by
+           field name. The field names come from the mapping type's
+           ``get_mapping()`` if it has one and from the first result
+           otherwise. ``.execute().fields`` tells you what they are.
 
         """
         return self._clone(next_step=('values_list', fields))
@@ -602,31 +1836,107 @@ class S(PythonMixin):
         """
         return self._clone(next_step=('values_dict', fields))
 
-    def order_by(self, *fields):
+    def only(self, *fields):
         """
-        Return a new S instance with results ordered as specified
-
-        You can change the order search results by specified fields::
-
-            q = (S().query(title='trucks')
-                    .order_by('title')
+        Return a new S instance that only fetches the specified fields
+        of the document source.
 
+        :arg fields: the fields to fetch. These can be patterns like
+            ``'author.*'``.
 
-        This orders search results by the `title` field in ascending
-        order.
+        This uses Elasticsearch source filtering, so the fields that
+        are left out never leave the cluster. It works with all the
+        results forms.
 
-        If you want to sort by descending order, prepend a ``-``::
+        .. Note::
 
-            q = (S().query(title='trucks')
-                    .order_by('-title')
+           Source filtering needs Elasticsearch 1.0 or later. On
+           older versions, use ``.values_dict()`` with field names
+           instead.
 
+        For example::
 
-        You can also sort by the computed field ``_score``.
+            s = S().query(title__text='trucks').only('id', 'title')
 
         .. Note::
 
-           Calling this again will overwrite previous ``.order_by()``
-           calls.
+           Calling this again will overwrite previous ``.only()``
+           calls. Calling it with no arguments fetches all fields
+           again.
+
+        """
+        return self._clone(next_step=('only', fields))
+
+    def defer(self, *fields):
+        """
+        Return a new S instance that doesn't fetch the specified fields
+        of the document source.
+
+        :arg fields: the fields to leave out. These can be patterns
+            like ``'body_*'``.
+
+        For example::
+
+            s = S().query(title__text='trucks').defer('body')
+
+        If you pass in ``None``, it will clear the deferred fields.
+
+        Like :py:meth:`elasticutils.S.only`, this needs Elasticsearch
+        1.0 or later.
+
+        See :py:meth:`elasticutils.S.fetch_deferred` if you need to
+        get at the deferred fields later.
+
+        """
+        return self._clone(next_step=('defer', fields))
+
+    def fetch_deferred(self, value=True):
+        """
+        Return a new S instance that lazily fetches fields left out by
+        ``.only()`` and ``.defer()``.
+
+        With this set, accessing a field that was left out on a
+        :py:class:`elasticutils.MappingType` result fetches the
+        missing fields for all the results in a single ``mget``
+        request.
+
+        For example::
+
+            s = S(BlogEntryMappingType).defer('body').fetch_deferred()
+
+            for result in s:
+                # The first access of body fetches the bodies of all
+                # the results.
+                print result.body
+
+        """
+        return self._clone(next_step=('fetch_deferred', value))
+
+    def order_by(self, *fields):
+        """
+        Return a new S instance with results ordered as specified
+
+        You can change the order search results by specified fields::
+
+            q = (S().query(title='trucks')
+                    .order_by('title')
+
+
+        This orders search results by the `title` field in ascending
+        order.
+
+        If you want to sort by descending order, prepend a ``-``::
+
+            q = (S().query(title='trucks')
+                    .order_by('-title')
+
+
+        You can also sort by the computed field ``_score``.
+
+        .. Note::
+
+           Calling this again will overwrite previous ``.order_by()``
+           calls.
 
         """
         return self._clone(next_step=('order_by', fields))
@@ -968,6 +2278,9 @@ class S(PythonMixin):
         highlight_fields = set()
         highlight_options = {}
         explain = False
+        source_include = []
+        source_exclude = []
+        fetch_deferred = False
         as_list = as_dict = False
         for action, value in self.steps:
             if action == 'order_by':
@@ -991,6 +2304,15 @@ class S(PythonMixin):
                 as_list, as_dict = False, True
             elif action == 'explain':
                 explain = value
+            elif action == 'only':
+                source_include = list(value)
+            elif action == 'defer':
+                if value == (None,):
+                    source_exclude = []
+                else:
+                    source_exclude.extend(value)
+            elif action == 'fetch_deferred':
+                fetch_deferred = value
             elif action == 'query':
                 queries.append(value)
             elif action == 'query_raw':
@@ -1013,7 +2335,8 @@ class S(PythonMixin):
                 else:
                     highlight_fields |= set(value[0])
                 highlight_options.update(value[1])
-            elif action in ('es', 'indexes', 'doctypes', 'boost'):
+            elif action in ('es', 'indexes', 'doctypes', 'boost', 'stream',
+                            'lean'):
                 # Ignore these--we use these elsewhere, but want to
                 # make sure lack of handling it here doesn't throw an
                 # error.
@@ -1086,7 +2409,17 @@ class S(PythonMixin):
         if explain:
             qs['explain'] = True
 
+        source_filter = {}
+        if source_include:
+            source_filter['include'] = source_include
+        if source_exclude:
+            source_filter['exclude'] = source_exclude
+        if source_filter:
+            qs['_source'] = source_filter
+
         self.fields, self.as_list, self.as_dict = fields, as_list, as_dict
+        self.source_filter = source_filter
+        self.fetch_deferred_fields = fetch_deferred
         return qs
 
     def _build_highlight(self, fields, options):
@@ -1279,13 +2612,37 @@ class S(PythonMixin):
         SearchResults instance and return it.
         """
         if self._results_cache is None:
-            response = self.raw()
+            if self._get_last_step('stream'):
+                response = {}
+                results = (self.to_python(hit)
+                           for hit in self.raw_stream(response))
+            else:
+                response = self.raw()
+                results = self.to_python(
+                    response.get('hits', {}).get('hits', []))
             ResultsClass = self.get_results_class()
-            results = self.to_python(response.get('hits', {}).get('hits', []))
             self._results_cache = ResultsClass(
-                self.type, response, results, self.fields)
+                self.type, response, results, self.fields,
+                lean=self._get_last_step('lean'))
+
+            if self.fetch_deferred_fields and self.source_filter:
+                loader = _DeferredFieldsLoader(
+                    self.get_es(), self.source_filter, self.to_python)
+                for obj in self._results_cache:
+                    if isinstance(obj, MappingType):
+                        loader.add(obj)
+
+            if self._get_last_step('lean'):
+                self._results_cache.discard_response()
         return self._results_cache
 
+    def _get_last_step(self, action, default=False):
+        """Returns the value of the last step for action"""
+        for step_action, value in reversed(self.steps):
+            if step_action == action:
+                return value
+        return default
+
     def get_es(self, default_builder=get_es):
         """Returns the Elasticsearch object to use.
 
@@ -1299,7 +2656,19 @@ class S(PythonMixin):
            Elasticsearch object for this S, subclass S and override
            this method.
 
+        .. Note::
+
+           The Elasticsearch object is stored on the S and shared with
+           clones that don't change the ``.es()`` settings, so
+           `default_builder` is only called once for them.
+
         """
+        # Forked processes and other gevent or eventlet hubs don't
+        # get this Elasticsearch; see get_es().
+        owner = _get_owner()
+        if self._es is not None and self._es[0] == owner:
+            return self._es[1]
+
         # .es() calls are incremental, so we go through them all and
         # update bits that are specified.
         args = {}
@@ -1307,9 +2676,9 @@ class S(PythonMixin):
             if action == 'es':
                 args.update(**value)
 
-        # TODO: store the Elasticsearch on the S if we've already
-        # created one since we don't need to do it multiple times.
-        return default_builder(**args)
+        es = default_builder(**args)
+        self._es = (owner, es)
+        return es
 
     def get_indexes(self, default_indexes=DEFAULT_INDEXES):
         """Returns the list of indexes to act on."""
@@ -1336,10 +2705,42 @@ class S(PythonMixin):
 
         return default_doctypes
 
+    def _search(self, qs, **params):
+        """Does a search with the given query and returns the response"""
+        index = self.get_indexes()
+        doc_type = self.get_doctypes()
+
+        if doc_type and not index:
+            raise BadSearch(
+                'You must specify an index if you are specifying doctypes.')
+
+        remaining = get_remaining_time()
+        if remaining is not None and 'scroll' not in params:
+            params['timeout'] = _es_timeout(remaining)
+
+        return self.get_es().search(
+            body=qs, index=index, doc_type=doc_type, **params)
+
     def raw(self):
         """
         Build query and passes to Elasticsearch, then returns the raw
         format returned.
+        """
+        qs = self._build_query()
+        hits = self._search(qs)
+
+        log.debug('[%s] %s' % (hits['took'], qs))
+        return hits
+
+    def raw_stream(self, response):
+        """
+        Build query and passes to Elasticsearch, then returns an
+        iterator of hits parsed incrementally from the response.
+
+        :arg response: dict that the rest of the response (took,
+            ``hits.total``, facets, ...) gets put in as the hits are
+            consumed
+
         """
         qs = self._build_query()
         es = self.get_es()
@@ -1351,17 +2752,65 @@ class S(PythonMixin):
             raise BadSearch(
                 'You must specify an index if you are specifying doctypes.')
 
-        hits = es.search(body=qs,
-                         index=self.get_indexes(),
-                         doc_type=self.get_doctypes())
+        params = None
+        remaining = get_remaining_time()
+        if remaining is not None:
+            params = {'timeout': _es_timeout(remaining)}
+
+        # Some environments can't send a body with GET.
+        method = 'GET' if es.transport.send_get_body_as == 'GET' else 'POST'
+        chunks = _stream_request(
+            es, method, _make_path(index, doc_type, '_search'),
+            params=params, body=qs)
+
+        log.debug('[stream] %s' % qs)
+        return iter_search_hits(chunks, response)
+
+    def _raw_bounded(self, size, upper_bound, fallback_size=None):
+        """
+        Does a search that stops collecting after `upper_bound`
+        matches and returns the raw response.
+
+        Clusters that don't support ``terminate_after`` get the search
+        without it, asking for `fallback_size` hits if that's given.
+
+        """
+        qs = self[:size]._build_query()
+        # None of these help count matches.
+        for key in ('facets', 'highlight', 'sort', 'explain'):
+            qs.pop(key, None)
+        if 'query' in qs:
+            # Matches don't need scores.
+            qs['query'] = {'constant_score': {'query': qs['query']}}
+
+        es = self.get_es()
+        if es not in _terminate_after_unsupported:
+            bounded_qs = dict(qs, terminate_after=upper_bound)
+            try:
+                hits = self._search(bounded_qs)
+            except TransportError as exc:
+                if not _rejects_terminate_after(exc):
+                    raise
+                # Elasticsearch before 1.4 rejects terminate_after.
+                _terminate_after_unsupported[es] = True
+            else:
+                log.debug('[%s] %s' % (hits['took'], bounded_qs))
+                return hits
 
+        if fallback_size is not None:
+            qs['size'] = fallback_size
+        hits = self._search(qs)
         log.debug('[%s] %s' % (hits['took'], qs))
         return hits
 
-    def count(self):
+    def count(self, upper_bound=None):
         """
         Executes search and returns number of results as an integer.
 
+        :arg upper_bound: if given, Elasticsearch stops counting once
+            it's found this many matches and the count is at most
+            this
+
         :returns: integer
 
         For example:
@@ -1369,12 +2818,48 @@ class S(PythonMixin):
         >>> s = S().query(name__prefix='Jimmy')
         >>> count = s.count()
 
+        Showing "more than 1000" is cheaper than counting everything:
+
+        >>> count = s.count(upper_bound=1001)
+        >>> label = 'more than 1000' if count > 1000 else str(count)
+
         """
-        if self._results_cache:
-            return self._results_cache.count
+        if self._results_cache is not None:
+            count = self._results_cache.count
+        elif upper_bound is not None:
+            count = self._raw_bounded(0, upper_bound)['hits']['total']
         else:
             return self[:0].raw()['hits']['total']
 
+        if upper_bound is not None:
+            count = min(count, upper_bound)
+        return count
+
+    def exists(self):
+        """
+        Returns whether there are any results for this search.
+
+        This tells Elasticsearch to stop at the first match, so it's
+        much cheaper than ``.count()`` for big result sets.
+
+        :returns: boolean
+
+        For example:
+
+        >>> s = S().query(name__prefix='Jimmy')
+        >>> if s.exists():
+        ...     print 'Found a Jimmy'
+        ...
+
+        """
+        if self._results_cache is not None:
+            return self._results_cache.count > 0
+        # With terminate_after, the total is enough and no hits need
+        # fetching. Without it, fetching a single hit keeps the search
+        # as close to cheap as it gets.
+        return bool(
+            self._raw_bounded(0, 1, fallback_size=1)['hits']['total'])
+
     def __len__(self):
         """
         Executes search and returns the number of results you'd get.
@@ -1456,9 +2941,6 @@ class S(PythonMixin):
         """
         return iter(self._do_search())
 
-    def _raw_facets(self):
-        return self._do_search().response.get('facets', {})
-
     def facet_counts(self):
         """
         Executes search and returns facet counts.
@@ -1469,22 +2951,134 @@ class S(PythonMixin):
         >>> facet_counts = s.facet_counts()
 
         """
-        return _facet_counts(self._raw_facets().items())
+        return self._do_search().facets
+
+    def _build_ids_query(self):
+        """Returns the query for a search that only fetches ids"""
+        qs = self._build_query()
+        # Nothing but _id and the search metadata comes back. An empty
+        # fields list leaves out the _source on 0.90 and 1.0 alike, so
+        # there's no need for 1.0's _source: false.
+        qs['fields'] = []
+        for key in ('_source', 'facets', 'highlight', 'explain'):
+            qs.pop(key, None)
+        return qs
+
+    def ids(self):
+        """
+        Executes search and returns a list of the ids of the matching
+        documents.
+
+        This tells Elasticsearch not to send the ``_source`` or any
+        fields and doesn't build results, so it's much cheaper than
+        executing the search when all you need are the ids. Slicing
+        works the same way it does for everything else.
+
+        :returns: list of ids
+
+        For example:
+
+        >>> s = S().query(name__prefix='Jimmy')
+        >>> ids = s[:100].ids()
+
+        .. Note::
+
+           If this S has already been executed, the ids come from the
+           cached results.
+
+        """
+        if self._results_cache is not None:
+            return [obj._id for obj in self._results_cache]
+
+        qs = self._build_ids_query()
+        hits = self._search(qs)
+
+        log.debug('[%s] [ids] %s' % (hits['took'], qs))
+        return [hit['_id'] for hit in hits['hits']['hits']]
+
+    def iter_ids(self, size=1000, scroll='1m'):
+        """
+        Returns an iterator of the ids of ALL the matching documents.
+
+        This does a scan search and scrolls through the results,
+        parsing each batch of ids as it comes in, so it works for
+        millions of ids without holding them all in memory.
+
+        :arg size: the number of ids to fetch per shard per batch
+        :arg scroll: how long Elasticsearch should keep the search
+            context around between batches
+
+        :returns: iterator of ids
+
+        For example:
+
+        >>> s = S().filter(status='spam')
+        >>> for id_ in s.iter_ids():
+        ...     print id_
+        ...
+
+        .. Note::
+
+           Scan searches aren't sorted and ignore slicing, so the ids
+           come back in no particular order and you get all of them.
+
+        """
+        qs = self._build_ids_query()
+        for key in ('sort', 'from', 'size'):
+            qs.pop(key, None)
+        es = self.get_es()
+        response = self._search(
+            qs, search_type='scan', scroll=scroll, size=size)
+        log.debug('[%s] [iter_ids] %s' % (response['took'], qs))
+
+        scroll_id = response['_scroll_id']
+        url = _make_path('_search', 'scroll')
+        try:
+            while True:
+                response = {}
+                chunks = _stream_request(
+                    es, 'POST', url, params={'scroll': scroll},
+                    body=scroll_id)
+                found = False
+                for hit in iter_search_hits(chunks, response):
+                    found = True
+                    yield hit['_id']
+                scroll_id = response['_scroll_id']
+                if not found:
+                    break
+        finally:
+            try:
+                es.clear_scroll(scroll_id)
+            except TransportError:
+                # The search context times out on its own anyhow.
+                pass
 
     def to_queryset(self):
         """
-        Returns a Django Queryset from the response from ES
+        Returns the model instances for the search results in the
+        order Elasticsearch returned them.
+
+        If this S has already been executed, the ids come from the
+        cached results. Otherwise this does a search that only asks
+        for ids. Either way, there's a single query against the
+        model.
 
         Example:
         >>> s = S().query(name__prefix='Jimmy')
         >>> s.to_queryset()
         [<Account: Jimmy John>]
+
+        .. Note::
+
+           This returns a list rather than a Django QuerySet because a
+           QuerySet can't preserve the Elasticsearch order.
+
         """
-        ids = zip(*self.values_list('id'))
-        if ids:
-            return self.type.get_model().objects.filter(id__in=ids[0])
+        if self._results_cache is not None:
+            ids = [obj._id for obj in self._results_cache]
         else:
-            return self.type.get_model().objects.none()
+            ids = self.ids()
+        return _get_objects_in_order(self.type.get_model(), ids)
 
 
 class MLT(PythonMixin):
@@ -1572,7 +3166,7 @@ class MLT(PythonMixin):
         Override this if that behavior isn't correct for you.
 
         """
-        if self.s:
+        if self.s is not None:
             return self.s.get_es()
 
         return self.es or get_es()
@@ -1587,7 +3181,12 @@ class MLT(PythonMixin):
         params = dict(self.query_params)
         mlt_fields = self.mlt_fields or params.pop('mlt_fields', [])
 
-        body = self.s._build_query() if self.s else ''
+        body = self.s._build_query() if self.s is not None else ''
+
+        remaining = get_remaining_time()
+        if remaining is not None:
+            # The mlt API takes the search timeout in the body.
+            body = dict(body or {}, timeout=_es_timeout(remaining))
 
         hits = es.mlt(
             index=self.index, doc_type=self.doctype, id=self.id,
@@ -1619,10 +3218,15 @@ class SearchResults(object):
         SearchResults instance
     :property took: the amount of time the search took
     :property count: the total results
-    :property response: the raw Elasticsearch search response
-    :property results: the search results from the response if any
+    :property response: the raw Elasticsearch search response; None
+        after ``discard_response()``
+    :property results: the search results from the response if any;
+        None if the search was streamed or after
+        ``discard_response()``
     :property fields: the list of fields specified by values_list
         or values_dict
+    :property lean: whether the results leave out the ``_source`` of
+        each hit; see :py:meth:`elasticutils.S.lean`
 
     When you iterate over this object, it returns the individual
     search results in the shape you asked for (object, tuple, dict,
@@ -1641,20 +3245,40 @@ class SearchResults(object):
 
     """
 
-    def __init__(self, type, response, results, fields):
+    def __init__(self, type, response, results, fields, lean=False):
         self.type = type
         self.response = response
-        self.took = response.get('took', 0)
-        self.count = response.get('hits', {}).get('total', 0)
-        self.facets = _facet_counts(response.get('facets', {}).items())
         self.results = results
         self.fields = fields
+        self.lean = lean
 
-        self.set_objects(self.results)
+        # For streamed searches, results is an iterator that fills in
+        # the rest of the response as it's consumed, so the objects
+        # have to be built first.
+        self.set_objects(results)
+        if not isinstance(results, list):
+            self.results = None
+
+        self.took = response.get('took', 0)
+        self.count = response.get('hits', {}).get('total', 0)
+        self.facets = _facet_counts(response.get('facets', {}).items())
 
     def set_objects(self, hits):
         raise NotImplementedError()
 
+    def discard_response(self):
+        """Drops the raw response and the hits
+
+        After this, only ``took``, ``count``, ``facets`` and the
+        results themselves are kept. This is handy for results that
+        are cached or kept around for a while.
+
+        See :py:meth:`elasticutils.S.lean`.
+
+        """
+        self.response = None
+        self.results = None
+
     def __iter__(self):
         return iter(self.objects)
 
@@ -1677,14 +3301,21 @@ class DictSearchResults(SearchResults):
     """
     def set_objects(self, results):
         key = 'fields' if self.fields else '_source'
-        self.objects = [decorate_with_metadata(DictResult(r[key]), r)
-                        for r in results]
+        self.objects = [
+            decorate_with_metadata(DictResult(r[key]), r, self.lean)
+            for r in results]
 
 
 class ListSearchResults(SearchResults):
     """
     SearchResults subclass that returns a results in the form of a
     tuple.
+
+    With no fields, the tuples hold the ``_source`` values ordered
+    by field name. The field names come from the ``properties`` of the
+    mapping type's ``get_mapping()`` if it has one, otherwise from the
+    first hit, and end up in ``fields``. Fields missing from a hit
+    are None.
     """
     def set_objects(self, results):
         if self.fields:
@@ -1698,11 +3329,38 @@ class ListSearchResults(SearchResults):
             if len(self.fields) == 1:
                 objs = [((obj,), r) for obj, r in objs]
         else:
-            objs = [(r['_source'].values(), r) for r in results]
-        self.objects = [decorate_with_metadata(TupleResult(obj), r)
+            objs = []
+            getter = None
+            for r in results:
+                if getter is None:
+                    self.fields = _get_source_fields(self.type, r)
+                    getter = _source_getter(self.fields)
+                objs.append((getter(r['_source']), r))
+        self.objects = [decorate_with_metadata(TupleResult(obj), r, self.lean)
                         for obj, r in objs]
 
 
+def _get_source_fields(mapping_type, hit):
+    """Returns the ordered field names for tuples built from _source
+
+    :arg mapping_type: the mapping type of the search; its
+        ``get_mapping()`` properties are used if it has any
+    :arg hit: the first hit which is used otherwise
+
+    """
+    get_mapping = getattr(mapping_type, 'get_mapping', None)
+    mapping = get_mapping() if get_mapping is not None else None
+    if mapping and mapping.get('properties'):
+        return sorted(mapping['properties'])
+    return sorted(hit['_source'])
+
+
+def _source_getter(fields):
+    """Returns a function that pulls fields out of a _source as a tuple"""
+    fields = tuple(fields)
+    return lambda source: tuple([source.get(field) for field in fields])
+
+
 def _convert_results_to_dict(r):
     """Takes a results from Elasticsearch and returns fields."""
     if 'fields' in r:
@@ -1713,28 +3371,112 @@ def _convert_results_to_dict(r):
 
 
 class ObjectSearchResults(SearchResults):
+    """
+    SearchResults subclass that returns results as mapping type
+    instances.
+
+    Each hit is built with the mapping type registered for its
+    ``_type`` (see :py:func:`elasticutils.register_mapping_type`). Hits
+    of the S's own mapping type and hits of unregistered mapping
+    types are built with the S's mapping type or
+    :py:class:`elasticutils.DefaultMappingType` for untyped S.
+    """
     def set_objects(self, results):
-        mapping_type = (self.type if self.type is not None
+        default_type = (self.type if self.type is not None
                         else DefaultMappingType)
-        self.objects = [
-            decorate_with_metadata(
-                mapping_type.from_results(_convert_results_to_dict(r)),
-                r)
-            for r in results]
+        try:
+            default_name = default_type.get_mapping_type_name()
+        except NotImplementedError:
+            default_name = None
+        get_mapping_type = _mapping_types.get
+
+        objects = []
+        for r in results:
+            doctype = r.get('_type')
+            if doctype == default_name:
+                mapping_type = default_type
+            else:
+                mapping_type = get_mapping_type(doctype, default_type)
+            objects.append(decorate_with_metadata(
+                mapping_type.from_results(_convert_results_to_dict(r)), r,
+                self.lean))
+        self.objects = objects
+
+    def load_objects(self):
+        """Loads the model instances for all the results
+
+        This groups the results by mapping type and calls
+        ``get_objects()`` once for each mapping type, so a page of
+        results with several mapping types does one query per mapping
+        type rather than one query per result. Afterwards, the
+        ``.object`` attribute of each result returns the loaded
+        instance.
+
+        """
+        by_type = {}
+        for obj in self.objects:
+            by_type.setdefault(obj.__class__, []).append(obj)
+
+        for mapping_type, objs in by_type.items():
+            try:
+                found = mapping_type.get_objects([obj._id for obj in objs])
+            except NoModelError:
+                # Nothing to load for mapping types without models.
+                continue
+            for obj in objs:
+                obj._object = found.get(unicode(obj._id))
 
     def to_queryset(self):
-        return self.type.get_model().objects.filter(id__in=map(lambda x: x.id, self.objects))
+        """Returns the model instances for these results in order
+
+        See :py:meth:`elasticutils.S.to_queryset`.
+
+        """
+        return _get_objects_in_order(
+            self.type.get_model(), [obj._id for obj in self.objects])
 
     def __iter__(self):
         return self.objects.__iter__()
 
 
-def decorate_with_metadata(obj, result):
-    """Return obj decorated with result-scope metadata."""
+def _get_objects_by_id(model, ids):
+    """Returns a dict of unicode id -> model instance for ids.
+
+    This does a single ``filter(id__in=...)`` query. Elasticsearch ids
+    are strings and model ids usually aren't, so they're keyed by
+    their unicode value.
+
+    """
+    if not ids:
+        return {}
+
+    return dict((unicode(obj.id), obj)
+                for obj in model.objects.filter(id__in=ids))
+
+
+def _get_objects_in_order(model, ids):
+    """Returns model instances for ids in the order of ids.
+
+    Ids that don't have a model instance are skipped.
+
+    """
+    objs = _get_objects_by_id(model, ids)
+    return [objs[unicode(id_)] for id_ in ids if unicode(id_) in objs]
+
+
+def decorate_with_metadata(obj, result, lean=False):
+    """Return obj decorated with result-scope metadata.
+
+    If lean is True, the ``_source`` of the result is left out, so
+    obj doesn't keep the hit's source around; ``_source`` is None.
+
+    """
     # Elasticsearch id
     obj._id = result.get('_id', 0)
+    # The index the document is in
+    obj._index = result.get('_index')
     # Source data
-    obj._source = result.get('_source', {})
+    obj._source = None if lean else result.get('_source', {})
     # The search result score
     obj._score = result.get('_score')
     # The document type
@@ -1746,10 +3488,108 @@ def decorate_with_metadata(obj, result):
     return obj
 
 
+class _DeferredFieldsLoader(object):
+    """Fetches source fields left out of a search for a page of results
+
+    All the results share one loader. The first time a deferred field
+    is accessed on any of them, the loader fetches the documents for
+    all of them with a single ``mget`` and fills in the missing
+    fields.
+
+    """
+    def __init__(self, es, source_filter, to_python):
+        self.es = es
+        self.include = source_filter.get('include', [])
+        self.exclude = source_filter.get('exclude', [])
+        self.to_python = to_python
+        self.objects = []
+
+    def add(self, obj):
+        self.objects.append(obj)
+        obj._deferred_loader = self
+
+    def is_deferred(self, name):
+        """Returns whether the field was left out by the source filter"""
+        if self.include and not any(fnmatchcase(name, pattern)
+                                    for pattern in self.include):
+            return True
+        return any(fnmatchcase(name, pattern) for pattern in self.exclude)
+
+    def load(self):
+        if not self.objects:
+            return
+
+        objects, self.objects = self.objects, []
+        docs = [{'_index': obj._index, '_type': obj._type, '_id': obj._id}
+                for obj in objects]
+        response = self.es.mget(body={'docs': docs})
+
+        for obj, doc in zip(objects, response['docs']):
+            source = self.to_python(doc.get('_source', {}))
+            for key, val in source.items():
+                obj._results_dict.setdefault(key, val)
+
+
 class NoModelError(Exception):
     pass
 
 
+_mapping_types = {}
+
+
+def register_mapping_type(mapping_type):
+    """Registers a mapping type class for its mapping type name.
+
+    Search results with that mapping type name are built with this
+    class, even if they come from an S for a different mapping type
+    or from an untyped S. This works as a class decorator, too.
+
+    For example::
+
+        @register_mapping_type
+        class ContactType(MappingType):
+            ...
+
+    :arg mapping_type: the mapping type class to register
+
+    :returns: the mapping type class
+
+    """
+    _mapping_types[mapping_type.get_mapping_type_name()] = mapping_type
+    return mapping_type
+
+
+def get_mapping_type(name, default=None):
+    """Returns the mapping type class registered for a name.
+
+    :arg name: the mapping type name
+    :arg default: what to return if no class is registered for name
+
+    """
+    return _mapping_types.get(name, default)
+
+
+class _FieldAccessor(object):
+    """Reads a field from a MappingType's results dict
+
+    This is a non-data descriptor, so instance attributes still take
+    precedence. Fields that aren't in the results dict raise
+    AttributeError, which hands the lookup over to
+    ``MappingType.__getattr__``.
+
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        try:
+            return obj._results_dict[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+
+
 class MappingType(object):
     """Base class for mapping types.
 
@@ -1779,16 +3619,42 @@ class MappingType(object):
                 return self.get_model().get(id=self._id)
 
     """
+    # Set by S.fetch_deferred() so fields left out of the search can
+    # be fetched on first access.
+    _deferred_loader = None
+
     def __init__(self):
         self._results_dict = {}
         self._object = None
 
     @classmethod
     def from_results(cls, results_dict):
+        if '_field_accessors' not in cls.__dict__:
+            cls._add_field_accessors()
         mt = cls()
         mt._results_dict = results_dict
         return mt
 
+    @classmethod
+    def _add_field_accessors(cls):
+        """Adds attribute accessors for the fields in the mapping
+
+        Fields declared in the ``properties`` of ``get_mapping()`` get
+        a `_FieldAccessor` on the class, so reading them doesn't go
+        through ``__getattr__``. Names the class already has are left
+        alone.
+
+        """
+        names = []
+        get_mapping = getattr(cls, 'get_mapping', None)
+        mapping = get_mapping() if get_mapping is not None else None
+        if mapping:
+            for name in mapping.get('properties', {}):
+                if name != 'object' and not hasattr(cls, name):
+                    setattr(cls, name, _FieldAccessor(name))
+                    names.append(name)
+        cls._field_accessors = names
+
     def _get_object_lazy(self):
         if self._object:
             return self._object
@@ -1844,6 +3710,31 @@ class MappingType(object):
         """
         return self.get_model().get(id=self._id)
 
+    @classmethod
+    def get_objects(cls, ids):
+        """Returns the model instances for a bunch of results
+
+        This gets called by
+        :py:meth:`elasticutils.ObjectSearchResults.load_objects` to
+        load the instances for all the results of this mapping type
+        at once.
+
+        By default, this calls `get_object()` for each id, so it does
+        one lookup per result. Override it to get them all at once.
+        The Django `MappingType` does that with one ``pk__in`` query.
+
+        :arg ids: list of Elasticsearch document ids
+
+        :returns: dict of unicode id -> model instance
+
+        """
+        objects = {}
+        for id_ in ids:
+            mt = cls()
+            mt._id = id_
+            objects[unicode(id_)] = mt.get_object()
+        return objects
+
     @classmethod
     def get_model(cls):
         """Return the model class related to this MappingType.
@@ -1873,21 +3764,42 @@ class MappingType(object):
             # 'object' is lazy-loading. We don't do this with a
             # property because Python sucks at properties and
             # subclasses.
-            return self.get_object()
+            return self._get_object_lazy()
 
         # If that doesn't exist, then check the results_dict.
         if name in self._results_dict:
             return self._results_dict[name]
 
+        if self._load_deferred(name):
+            return self._results_dict[name]
+
         raise AttributeError
 
+    def _load_deferred(self, name):
+        """Fetches deferred fields if name is one of them
+
+        :returns: True if name is now in the results dict
+
+        """
+        loader = self._deferred_loader
+        if loader is None or not loader.is_deferred(name):
+            return False
+
+        loader.load()
+        return name in self._results_dict
+
     # Simulate read-only container access
 
     def __len__(self):
         return self._results_dict.__len__()
 
     def __getitem__(self, key):
-        return self._results_dict.__getitem__(key)
+        try:
+            return self._results_dict[key]
+        except KeyError:
+            if self._load_deferred(key):
+                return self._results_dict[key]
+            raise
 
     def __iter__(self):
         return self._results_dict.__iter__()
@@ -1903,6 +3815,354 @@ class DefaultMappingType(MappingType):
     """This is the default mapping type for S."""
 
 
+class BulkResult(namedtuple('BulkResult',
+                            'op_type index id ok status error')):
+    """The result of one action in a bulk request
+
+    * ``op_type``: ``'index'``, ``'create'``, ``'update'`` or
+      ``'delete'``
+    * ``index``: the index; if the action was sent to an alias, this
+      is the index the alias points to
+    * ``id``: the document id
+    * ``ok``: whether the action worked
+    * ``status``: the HTTP status of the action, or None if
+      Elasticsearch didn't say
+    * ``error``: the error if the action failed, otherwise None
+
+    """
+    __slots__ = ()
+
+
+#: Statuses that mean Elasticsearch was too busy to do an action, so
+#: streaming_bulk() tries it again later.
+BULK_RETRY_STATUSES = (429, 503)
+
+
+def streaming_bulk(es, actions, chunk_size=500,
+                   max_chunk_bytes=10 * 1024 * 1024, max_retries=3,
+                   retry_backoff=0.5, thread_count=1, queue_size=2,
+                   **params):
+    """Sends actions to Elasticsearch in bulk requests
+
+    This reads `actions` as it goes, so it can be a generator, and
+    yields a :py:class:`elasticutils.BulkResult` for each action.
+    Results for actions that got tried again or were sent by another
+    thread can come later than the others, so use their ids to match
+    them up.
+
+    :arg es: the `Elasticsearch` to use
+    :arg actions: iterable of actions in the format
+        `elasticsearch.helpers.streaming_bulk` takes
+    :arg chunk_size: the most actions to send in one request
+    :arg max_chunk_bytes: the most bytes to send in one request; an
+        action that's bigger than this gets sent by itself
+    :arg max_retries: how many times to try again the actions
+        Elasticsearch rejected because it was busy (see
+        `BULK_RETRY_STATUSES`) or that were in a request that failed
+        because of a connection error or a busy node
+    :arg retry_backoff: seconds to wait before trying again the first
+        time; this doubles each time after
+    :arg thread_count: how many threads send requests at the same
+        time; actions for the same id always go to the same thread, so
+        they're done in order
+    :arg queue_size: with more than one thread, how many requests
+        each thread can have waiting; reading `actions` waits when the
+        thread they go to has this many
+    :arg params: other arguments for `Elasticsearch.bulk` like
+        ``refresh``
+
+    Other failed actions aren't tried again. This doesn't raise
+    errors for them, so check the results.
+
+    Example::
+
+        actions = ({'_index': 'blog', '_type': 'entry', '_id': entry.id,
+                    '_source': entry.to_dict()} for entry in entries)
+        for result in streaming_bulk(get_es(), actions, thread_count=4):
+            if not result.ok:
+                log.error('Unable to index {0}: {1}'.format(
+                    result.id, result.error))
+
+    .. Note::
+
+       With more than one thread, make sure the `Elasticsearch` has a
+       connection pool at least `thread_count` big; see the
+       ``maxsize`` argument of :py:func:`elasticutils.get_es`.
+
+    """
+    items = _serialize_bulk_actions(es, actions)
+    chunks = _chunk_bulk_items(items, chunk_size, max_chunk_bytes,
+                               thread_count)
+    if thread_count > 1:
+        return _parallel_bulk(es, chunks, thread_count, queue_size,
+                              max_retries, retry_backoff, params)
+    return _serial_bulk(es, chunks, max_retries, retry_backoff, params)
+
+
+def _serial_bulk(es, chunks, max_retries, retry_backoff, params):
+    for partition, chunk in chunks:
+        for result in _send_bulk_items(es, chunk, max_retries,
+                                       retry_backoff, params):
+            yield result
+
+
+# Put in the results queue by a _bulk_worker when it's done.
+_BULK_WORKER_DONE = object()
+
+
+class _BulkWorkerError(object):
+    """Carries an exception from a _bulk_worker to the results"""
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+
+def _parallel_bulk(es, chunks, thread_count, queue_size, max_retries,
+                   retry_backoff, params):
+    results = Queue.Queue()
+    stop = threading.Event()
+    queues = [Queue.Queue(queue_size) for i in range(thread_count)]
+    for queue in queues:
+        thread = threading.Thread(
+            target=_bulk_worker,
+            args=(es, queue, results, stop, max_retries, retry_backoff,
+                  params))
+        thread.daemon = True
+        thread.start()
+
+    def handle(result):
+        if isinstance(result, _BulkWorkerError):
+            exc_info = result.exc_info
+            raise exc_info[0], exc_info[1], exc_info[2]
+        return result is not _BULK_WORKER_DONE
+
+    def stop_workers():
+        for queue in queues:
+            queue.put(None)
+
+    done = 0
+    finished = False
+    try:
+        for partition, chunk in chunks:
+            # This waits when the worker is behind, so reading actions
+            # can't get far ahead of sending them.
+            queues[partition].put(chunk)
+            while True:
+                try:
+                    result = results.get_nowait()
+                except Queue.Empty:
+                    break
+                if handle(result):
+                    yield result
+                else:
+                    done += 1
+
+        # The workers stop when they're done with what's queued.
+        stop_workers()
+        finished = True
+        while done < thread_count:
+            result = results.get()
+            if handle(result):
+                yield result
+            else:
+                done += 1
+    finally:
+        if done < thread_count:
+            # Something went wrong or the results aren't wanted
+            # anymore, so the workers skip what's queued.
+            stop.set()
+            if not finished:
+                stop_workers()
+
+
+def _bulk_worker(es, chunks, results, stop, max_retries, retry_backoff,
+                 params):
+    """Sends chunks from a queue until it gets None"""
+    try:
+        for chunk in iter(chunks.get, None):
+            if stop.is_set():
+                continue
+            try:
+                for result in _send_bulk_items(es, chunk, max_retries,
+                                               retry_backoff, params):
+                    results.put(result)
+            except Exception:
+                stop.set()
+                results.put(_BulkWorkerError(sys.exc_info()))
+    finally:
+        results.put(_BULK_WORKER_DONE)
+
+
+def _send_bulk_items(es, chunk, max_retries, retry_backoff, params):
+    """Sends a chunk, trying again what's worth trying again"""
+    tries = 0
+    while chunk:
+        retry = []
+        for item, (result, retryable) in zip(
+                chunk, _send_bulk_chunk(es, chunk, params)):
+            if retryable and tries < max_retries:
+                retry.append(item)
+            else:
+                yield result
+
+        chunk = retry
+        if chunk:
+            time.sleep(retry_backoff * 2 ** tries)
+            tries += 1
+
+
+def _serialize_bulk_actions(es, actions):
+    """Yields (op_type, index, id, bulk request lines) for each action"""
+    serializer = es.transport.serializer
+    for action in actions:
+        command, data = expand_action(action)
+        op_type, meta = command.items()[0]
+        lines = serializer.dumps(command) + '\n'
+        if data is not None:
+            lines += serializer.dumps(data) + '\n'
+        yield op_type, meta.get('_index'), meta.get('_id'), lines
+
+
+def _chunk_bulk_items(items, chunk_size, max_chunk_bytes, partitions=1):
+    """Groups serialized items into lists that fit in one request
+
+    Items are split into partitions by id, so all the items for an id
+    are in the same partition.
+
+    :returns: generator of (partition, list of items)
+
+    """
+    chunks = [[] for i in range(partitions)]
+    sizes = [0] * partitions
+    counter = itertools.count()
+    for item in items:
+        if partitions == 1:
+            partition = 0
+        elif item[2] is None:
+            # Elasticsearch makes up the id, so any partition will do.
+            partition = next(counter) % partitions
+        else:
+            partition = hash(item[2]) % partitions
+
+        chunk = chunks[partition]
+        item_size = len(item[3])
+        if chunk and (len(chunk) >= chunk_size or
+                      sizes[partition] + item_size > max_chunk_bytes):
+            yield partition, chunk
+            chunk = chunks[partition] = []
+            sizes[partition] = 0
+        chunk.append(item)
+        sizes[partition] += item_size
+
+    for partition, chunk in enumerate(chunks):
+        if chunk:
+            yield partition, chunk
+
+
+def _send_bulk_chunk(es, chunk, params):
+    """Sends one bulk request
+
+    :returns: list of (BulkResult, whether to try again) in the same
+        order as chunk
+
+    """
+    try:
+        response = es.bulk(body=''.join(item[3] for item in chunk),
+                           **params)
+    except TransportError as exc:
+        status = exc.status_code if isinstance(exc.status_code, int) else None
+        retryable = (isinstance(exc, ConnectionError) or
+                     status in BULK_RETRY_STATUSES)
+        return [(BulkResult(op_type, index, id_, False, status, str(exc)),
+                 retryable)
+                for op_type, index, id_, lines in chunk]
+
+    results = []
+    for (op_type, index, id_, lines), item in zip(
+            chunk, response['items']):
+        info = item.values()[0]
+        status = info.get('status')
+        error = info.get('error')
+        ok = error is None and (status is None or status < 300)
+        # Elasticsearch 0.90 doesn't send a status with errors.
+        retryable = status in BULK_RETRY_STATUSES or (
+            isinstance(error, basestring) and
+            error.startswith('EsRejectedExecutionException'))
+        results.append((
+            BulkResult(op_type, info.get('_index', index),
+                       info.get('_id', id_), ok, status, error),
+            retryable))
+    return results
+
+
+#: Index settings `Indexable.bulk_load_mode` uses while loading. Not
+#: refreshing, not replicating and flushing the translog less often
+#: makes loading a lot faster.
+BULK_LOAD_SETTINGS = {
+    'index.refresh_interval': '-1',
+    'index.number_of_replicas': 0,
+    'index.translog.flush_threshold_size': '1gb',
+}
+
+#: What `Indexable.bulk_load_mode` puts back for settings the index
+#: didn't have, which means it was using Elasticsearch's defaults.
+BULK_LOAD_DEFAULTS = {
+    'index.refresh_interval': '1s',
+    'index.number_of_replicas': 1,
+    'index.translog.flush_threshold_size': '200mb',
+}
+
+
+def _flatten_settings(settings, prefix=''):
+    """Returns nested settings as a dict of dotted names -> values
+
+    Elasticsearch 0.90 gives settings as ``{'index.refresh_interval':
+    '1s'}`` and 1.0 as ``{'index': {'refresh_interval': '1s'}}``. This
+    turns both into the first.
+
+    """
+    flat = {}
+    for key, value in settings.items():
+        if isinstance(value, dict):
+            flat.update(_flatten_settings(value, prefix + key + '.'))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+#: Keys of update bodies that create the document if it's missing.
+UPSERT_KEYS = ('upsert', 'doc_as_upsert', 'scripted_upsert')
+
+
+def _without_upsert(body):
+    """Returns an update body or action that only updates
+
+    Indexes being rebuilt get updates this way. An upsert would create
+    a document from part of it and the full one wouldn't get loaded.
+
+    """
+    return dict((key, value) for key, value in body.items()
+                if key not in UPSERT_KEYS)
+
+
+def _write_each(indexes, write):
+    """Calls write(index) for each index
+
+    Errors for the first index get raised. Errors for the others only
+    get logged and documents missing from them are ignored, since
+    they're being rebuilt.
+
+    """
+    write(indexes[0])
+    for index in indexes[1:]:
+        try:
+            write(index)
+        except NotFoundError:
+            pass
+        except TransportError as exc:
+            log.warning('Unable to write to {0}: {1}'.format(
+                index, repr(exc)))
+
+
 class Indexable(object):
     """Mixin for mapping types with all the indexing hoo-hah.
 
@@ -1922,6 +4182,34 @@ class Indexable(object):
         """
         return get_es()
 
+    @classmethod
+    def get_write_indexes(cls, es=None):
+        """Returns the indexes to write documents to
+
+        Writes go to all of them. Only errors for the first one get
+        raised or reported; the others are for indexes that are being
+        rebuilt, so documents missing from them are fine. Updates to
+        those don't upsert, since that would leave a partial document
+        where the full one should get loaded. Results for those are
+        left out of the results of the bulk methods, so give their
+        real names rather than aliases.
+
+        By default, this is ``[cls.get_index()]``.
+
+        :arg es: the `Elasticsearch` to look things up with, if that's
+            needed
+
+        :returns: list of index names
+
+        """
+        return [cls.get_index()]
+
+    @classmethod
+    def _get_write_indexes(cls, es, index):
+        if index is not None:
+            return [index]
+        return cls.get_write_indexes(es)
+
     @classmethod
     def get_mapping(cls):
         """Returns the mapping for this mapping type.
@@ -2016,14 +4304,20 @@ class Indexable(object):
         if es is None:
             es = cls.get_es()
 
-        if index is None:
-            index = cls.get_index()
-
         kw = {}
         if not overwrite_existing:
             kw['op_type'] = 'create'
-        es.index(index=index, doc_type=cls.get_mapping_type_name(),
-                 body=document, id=id_, **kw)
+        doctype = cls.get_mapping_type_name()
+
+        def write(index):
+            es.index(index=index, doc_type=doctype, body=document, id=id_,
+                     **kw)
+
+        indexes = cls._get_write_indexes(es, index)
+        if id_ is None:
+            # Each index would make up a different id.
+            indexes = indexes[:1]
+        _write_each(indexes, write)
 
     @classmethod
     def bulk_index(cls, documents, id_field='id', es=None, index=None):
@@ -2051,22 +4345,276 @@ class Indexable(object):
            immediately, make sure to refresh the index by calling
            ``refresh_index()``.
 
+        :raises: `elasticsearch.helpers.BulkIndexError` if any
+            documents failed; its ``errors`` are the
+            :py:class:`elasticutils.BulkResult` for them
+
+        """
+        failed = [result for result in cls.streaming_bulk_index(
+                      documents, id_field=id_field, es=es, index=index)
+                  if not result.ok]
+        if failed:
+            raise BulkIndexError(
+                '{0} document(s) failed to index.'.format(len(failed)),
+                failed)
+
+    @classmethod
+    def streaming_bulk_index(cls, documents, id_field='id', es=None,
+                             index=None, **kwargs):
+        """Indexes documents in bulk, yielding a result for each one
+
+        Unlike `bulk_index`, this reads `documents` as it goes, sizes
+        requests by bytes as well as count, tries again documents
+        Elasticsearch was too busy for and doesn't stop at the first
+        document that fails.
+
+        :arg documents: iterable of Python dicts representing
+            individual documents to be added to the index
+
+            .. Note::
+
+               This must be serializable into JSON.
+
+        :arg id_field: The name of the field to use as the document
+            id. This defaults to 'id'.
+
+        :arg es: The `Elasticsearch` to use. If you don't specify an
+            `Elasticsearch`, it'll use `cls.get_es()`.
+
+        :arg index: The name of the index to use. If you don't specify one
+            it'll use `cls.get_index()`.
+
+        :arg kwargs: ``chunk_size``, ``max_chunk_bytes``,
+            ``max_retries``, ``retry_backoff``, ``thread_count`` and
+            other arguments for :py:func:`elasticutils.streaming_bulk`
+
+        :returns: generator of :py:class:`elasticutils.BulkResult`
+
+        Example::
+
+            docs = (MyMappingType.extract_document(obj.id, obj)
+                    for obj in objs)
+            failed = [result for result in
+                      MyMappingType.streaming_bulk_index(
+                          docs, thread_count=4)
+                      if not result.ok]
+
+        """
+        actions = ({'_op_type': 'index', '_id': doc[id_field],
+                    '_source': doc}
+                   for doc in documents)
+        return cls._bulk(actions, es, index, kwargs)
+
+    @classmethod
+    def update(cls, id_, partial_doc, upsert=None, es=None, index=None,
+               **kwargs):
+        """Updates some fields of a document
+
+        Only the changed fields get sent and Elasticsearch merges them
+        into the document it has, so you don't have to extract the
+        whole document.
+
+        :arg id_: the id of the document
+        :arg partial_doc: Python dict of the fields to change
+        :arg upsert: Python dict of the document to index if there
+            isn't one with this id; if None, updating a document that
+            doesn't exist fails
+
+        :arg es: The `Elasticsearch` to use. If you don't specify an
+            `Elasticsearch`, it'll use `cls.get_es()`.
+
+        :arg index: The name of the index to use. If you don't specify one
+            it'll use `cls.get_index()`.
+
+        :arg kwargs: other arguments for `Elasticsearch.update` like
+            ``retry_on_conflict`` and ``refresh``
+
+        Example::
+
+            MyMappingType.update(obj.id, {'views': obj.views})
+
         """
+        cls._update(cls.update_action(id_, partial_doc, upsert), es,
+                    index, kwargs)
+
+    @classmethod
+    def script_update(cls, id_, script, params=None, upsert=None,
+                      es=None, index=None, **kwargs):
+        """Updates a document with a script
+
+        :arg id_: the id of the document
+        :arg script: the script; it changes ``ctx._source``
+        :arg params: Python dict of variables for the script
+        :arg upsert: Python dict of the document to index if there
+            isn't one with this id; if None, updating a document that
+            doesn't exist fails
+
+        :arg es: The `Elasticsearch` to use. If you don't specify an
+            `Elasticsearch`, it'll use `cls.get_es()`.
+
+        :arg index: The name of the index to use. If you don't specify one
+            it'll use `cls.get_index()`.
+
+        :arg kwargs: other arguments for `Elasticsearch.update` like
+            ``lang``, ``retry_on_conflict`` and ``refresh``
+
+        Example::
+
+            MyMappingType.script_update(
+                obj.id, 'ctx._source.views += n', params={'n': 1},
+                upsert={'id': obj.id, 'views': 1})
+
+        """
+        cls._update(cls.script_update_action(id_, script, params, upsert),
+                    es, index, kwargs)
+
+    @classmethod
+    def _update(cls, action, es, index, kwargs):
         if es is None:
             es = cls.get_es()
 
-        if index is None:
-            index = cls.get_index()
+        body = dict(action)
+        id_ = body.pop('_id')
+        del body['_op_type']
+        doctype = cls.get_mapping_type_name()
+
+        indexes = cls._get_write_indexes(es, index)
+
+        def write(index):
+            es.update(index=index, doc_type=doctype, id=id_,
+                      body=body if index == indexes[0] else
+                      _without_upsert(body),
+                      **kwargs)
+
+        _write_each(indexes, write)
+
+    @classmethod
+    def update_action(cls, id_, partial_doc, upsert=None):
+        """Returns a bulk action that does what `update()` does
+
+        Pass it to `bulk()` along with other actions.
+
+        Example::
+
+            MyMappingType.bulk(
+                MyMappingType.update_action(obj.id, {'views': obj.views})
+                for obj in objs)
+
+        """
+        action = {'_op_type': 'update', '_id': id_, 'doc': partial_doc}
+        if upsert is not None:
+            action['upsert'] = upsert
+        return action
+
+    @classmethod
+    def script_update_action(cls, id_, script, params=None, upsert=None):
+        """Returns a bulk action that does what `script_update()` does
+
+        Pass it to `bulk()` along with other actions.
+
+        """
+        action = {'_op_type': 'update', '_id': id_, 'script': script}
+        if params is not None:
+            action['params'] = params
+        if upsert is not None:
+            action['upsert'] = upsert
+        return action
+
+    @classmethod
+    def bulk(cls, actions, es=None, index=None, **kwargs):
+        """Does a mix of index, create, update and delete actions in bulk
+
+        :arg actions: iterable of actions in the format
+            :py:func:`elasticutils.streaming_bulk` takes; ``_index``
+            and ``_type`` default to this mapping type's
+
+            For example::
+
+                [{'_op_type': 'index', '_id': 1, '_source': doc},
+                 {'_op_type': 'update', '_id': 2, 'doc': {'views': 5}},
+                 {'_op_type': 'delete', '_id': 3}]
+
+        :arg es: The `Elasticsearch` to use. If you don't specify an
+            `Elasticsearch`, it'll use `cls.get_es()`.
+
+        :arg index: The name of the index to use. If you don't specify one
+            it'll use `cls.get_index()`.
 
-        documents = (dict(d, _id=d[id_field]) for d in documents)
+        :arg kwargs: other arguments for
+            :py:func:`elasticutils.streaming_bulk`
 
-        bulk_index(
-            es,
-            documents,
-            index=index,
-            doc_type=cls.get_mapping_type_name(),
-            raise_on_error=True
-        )
+        :returns: list of :py:class:`elasticutils.BulkResult` for the
+            actions that failed
+
+        """
+        return [result for result in cls._bulk(actions, es, index, kwargs)
+                if not result.ok]
+
+    @classmethod
+    def _bulk(cls, actions, es, index, kwargs):
+        """Sends actions to the write indexes
+
+        Actions that say what index they're for only go to that one.
+
+        :returns: generator of results for all but the indexes being
+            rebuilt
+
+        """
+        if es is None:
+            es = cls.get_es()
+
+        indexes = cls._get_write_indexes(es, index)
+        doctype = cls.get_mapping_type_name()
+
+        def expand():
+            for action in actions:
+                if '_index' in action:
+                    yield dict({'_type': doctype}, **action)
+                elif action.get('_id') is None:
+                    # Each index would make up a different id.
+                    yield dict({'_index': indexes[0], '_type': doctype},
+                               **action)
+                else:
+                    yield dict({'_index': indexes[0], '_type': doctype},
+                               **action)
+                    for index in indexes[1:]:
+                        yield dict({'_index': index, '_type': doctype},
+                                   **_without_upsert(action))
+
+        rebuilding = set(indexes[1:])
+        for result in streaming_bulk(es, expand(), **kwargs):
+            if result.index not in rebuilding:
+                yield result
+            elif not result.ok and result.status != 404:
+                log.warning('Unable to write {0} to {1}: {2}'.format(
+                    result.id, result.index, result.error))
+
+    @classmethod
+    def bulk_unindex(cls, ids, es=None, index=None, **kwargs):
+        """Removes a batch of documents from the index
+
+        Documents that aren't in the index don't count as failures.
+
+        :arg ids: iterable of Elasticsearch ids of the documents to
+            remove
+
+        :arg es: The `Elasticsearch` to use. If you don't specify an
+            `Elasticsearch`, it'll use `cls.get_es()`.
+
+        :arg index: The name of the index to use. If you don't specify one
+            it'll use `cls.get_index()`.
+
+        :arg kwargs: other arguments for
+            :py:func:`elasticutils.streaming_bulk`
+
+        :returns: list of :py:class:`elasticutils.BulkResult` for the
+            documents that couldn't be removed
+
+        """
+        actions = ({'_op_type': 'delete', '_id': id_} for id_ in ids)
+        return [result
+                for result in cls.bulk(actions, es=es, index=index, **kwargs)
+                if result.status != 404]
 
     @classmethod
     def unindex(cls, id_, es=None, index=None):
@@ -2085,10 +4633,12 @@ class Indexable(object):
         if es is None:
             es = cls.get_es()
 
-        if index is None:
-            index = cls.get_index()
+        doctype = cls.get_mapping_type_name()
+
+        def write(index):
+            es.delete(index=index, doc_type=doctype, id=id_)
 
-        es.delete(index=index, doc_type=cls.get_mapping_type_name(), id=id_)
+        _write_each(cls._get_write_indexes(es, index), write)
 
     @classmethod
     def refresh_index(cls, es=None, index=None):
@@ -2114,3 +4664,75 @@ class Indexable(object):
             index = cls.get_index()
 
         es.indices.refresh(index=index)
+
+    @classmethod
+    @contextmanager
+    def bulk_load_mode(cls, es=None, index=None, settings=None,
+                       optimize=False, max_num_segments=1):
+        """Context manager that makes the index quicker to load
+
+        This changes the index settings to `BULK_LOAD_SETTINGS` and
+        the ones in `settings` for the with block and puts the old
+        values back afterwards, even if there's an error. While it's
+        in effect, documents don't show up in searches and aren't
+        replicated.
+
+        :arg es: The `Elasticsearch` to use. If you don't specify an
+            `Elasticsearch`, it'll use `cls.get_es()`.
+
+        :arg index: The name of the index to use. If you don't specify one
+            it'll use `cls.get_index()`. If it's an alias, the settings
+            of each index it points to get put back.
+
+        :arg settings: dict of index settings to use as well as or
+            instead of `BULK_LOAD_SETTINGS`. Each one has to be set on
+            the index or be in `BULK_LOAD_DEFAULTS`, so there's a value
+            to put back.
+
+        :raises ValueError: if there's no value to put back for one
+            of the settings; nothing is changed then
+
+        :arg optimize: whether to optimize the index at the end if
+            there wasn't an error
+
+        :arg max_num_segments: how many segments to optimize the index
+            down to
+
+        Example::
+
+            with MyMappingType.bulk_load_mode(optimize=True):
+                MyMappingType.bulk_index(documents)
+
+        """
+        if es is None:
+            es = cls.get_es()
+
+        if index is None:
+            index = cls.get_index()
+
+        load_settings = dict(BULK_LOAD_SETTINGS)
+        load_settings.update(settings or {})
+
+        # index name -> the settings to put back
+        old_settings = {}
+        for name, info in es.indices.get_settings(index=index).items():
+            current = _flatten_settings(info.get('settings', {}))
+            old_settings[name] = dict(
+                (key, current.get(key, BULK_LOAD_DEFAULTS.get(key)))
+                for key in load_settings)
+            unknown = sorted(key for key, value in old_settings[name].items()
+                             if value is None)
+            if unknown:
+                raise ValueError(
+                    '{0} has no value for {1} to put back.'.format(
+                        name, ', '.join(unknown)))
+
+        es.indices.put_settings(index=index, body=load_settings)
+        try:
+            yield
+            if optimize:
+                es.indices.optimize(index=index,
+                                    max_num_segments=max_num_segments)
+        finally:
+            for name, body in sorted(old_settings.items()):
+                es.indices.put_settings(index=name, body=body)
@@ -1,4 +1,5 @@
 import logging
+import time
 from functools import wraps
 
 import elasticsearch
@@ -7,11 +8,23 @@ from django.conf import settings
 from django.shortcuts import render
 from django.utils.decorators import decorator_from_middleware_with_args
 
-from elasticutils import F, InvalidFieldActionError, MLT, NoModelError  # noqa
+try:
+    from importlib import import_module
+except ImportError:
+    # Python 2.6
+    from django.utils.importlib import import_module
+
+from elasticutils import F, InvalidFieldActionError, NoModelError  # noqa
+from elasticutils import CircuitOpenError, DeadlineExceeded  # noqa
+from elasticutils import register_mapping_type  # noqa
+from elasticutils import get_circuit_breaker as base_get_circuit_breaker
+from elasticutils import MLT as BaseMLT
 from elasticutils import S as BaseS
 from elasticutils import get_es as base_get_es
 from elasticutils import Indexable as BaseIndexable
 from elasticutils import MappingType as BaseMappingType
+from elasticutils import warm_up as base_warm_up
+from elasticutils.utils import chunked
 
 
 log = logging.getLogger('elasticutils')
@@ -19,6 +32,22 @@ log = logging.getLogger('elasticutils')
 
 ES_EXCEPTIONS = (
     elasticsearch.ElasticsearchException,
+    DeadlineExceeded,
+)
+
+
+# Django setting -> elasticutils.get_es argument
+CONNECTION_SETTINGS = (
+    ('ES_CONNECTION_CLASS', 'connection_class'),
+    ('ES_POOL_MAXSIZE', 'maxsize'),
+    ('ES_POOL_BLOCK', 'block'),
+    ('ES_KEEP_ALIVE', 'keep_alive'),
+    ('ES_SELECTOR_CLASS', 'selector_class'),
+    ('ES_SNIFF_INTERVAL', 'sniff_interval'),
+    ('ES_COOPERATIVE', 'cooperative'),
+    ('ES_COMPRESS', 'compress'),
+    ('ES_COMPRESS_LEVEL', 'compress_level'),
+    ('ES_COMPRESS_THRESHOLD', 'compress_threshold'),
 )
 
 
@@ -42,15 +71,118 @@ def get_es(**overrides):
         'timeout': getattr(settings, 'ES_TIMEOUT', 5)
         }
 
+    # Leave these out unless they're set so elasticutils picks the
+    # defaults.
+    for setting, arg in CONNECTION_SETTINGS:
+        if hasattr(settings, setting):
+            defaults[arg] = getattr(settings, setting)
+
     defaults.update(overrides)
+    if ('circuit_breaker' not in defaults and
+            getattr(settings, 'ES_CIRCUIT_BREAKER', False)):
+        defaults['circuit_breaker'] = get_circuit_breaker(defaults['urls'])
     return base_get_es(**defaults)
 
 
+def get_read_es(**overrides):
+    """Return a elasticsearch Elasticsearch object for searching.
+
+    This is like `get_es()`, but talks to the nodes in
+    ``ES_READ_URLS`` if that's set.
+
+    :arg overrides: Allows you to override defaults to create the
+        ElasticSearch object. See `get_es()`.
+
+    """
+    overrides.setdefault('urls', _get_read_urls())
+    return get_es(**overrides)
+
+
+def _get_read_urls():
+    return getattr(settings, 'ES_READ_URLS', None) or settings.ES_URLS
+
+
+def get_write_es(**overrides):
+    """Return a elasticsearch Elasticsearch object for indexing.
+
+    This is like `get_es()`, but talks to the nodes in
+    ``ES_WRITE_URLS`` if that's set.
+
+    :arg overrides: Allows you to override defaults to create the
+        ElasticSearch object. See `get_es()`.
+
+    """
+    overrides.setdefault(
+        'urls', getattr(settings, 'ES_WRITE_URLS', None) or settings.ES_URLS)
+    return get_es(**overrides)
+
+
+def warm_up():
+    """Opens connections and runs searches using settings from
+    ``settings.py``
+
+    This opens ``ES_WARMUP_CONNECTIONS`` connections to each host in
+    ``ES_READ_URLS`` and ``ES_WRITE_URLS`` and runs the searches from
+    ``ES_WARMUP_QUERIES``. See :py:func:`elasticutils.warm_up`.
+
+    If ``ES_WARMUP`` is True, this gets called when a Celery worker
+    process starts. For web processes, call it at the end of your
+    ``wsgi.py``.
+
+    :returns: the number of connections opened
+
+    """
+    if getattr(settings, 'ES_DISABLED', False):
+        return 0
+
+    connections = getattr(settings, 'ES_WARMUP_CONNECTIONS', 1)
+    queries = []
+    for path in getattr(settings, 'ES_WARMUP_QUERIES', ()):
+        module_name, _, name = path.rpartition('.')
+        queries.append(getattr(import_module(module_name), name)())
+
+    read_es = get_read_es()
+    opened = base_warm_up(read_es, connections, queries)
+    write_es = get_write_es()
+    if write_es is not read_es:
+        opened += base_warm_up(write_es, connections)
+    return opened
+
+
+def get_circuit_breaker(urls=None):
+    """Returns the circuit breaker for a cluster using settings from
+    ``settings.py``.
+
+    :arg urls: the urls of the cluster; defaults to ``ES_URLS``
+
+    """
+    return base_get_circuit_breaker(
+        urls or settings.ES_URLS,
+        failure_threshold=getattr(
+            settings, 'ES_CIRCUIT_BREAKER_THRESHOLD', 5),
+        reset_timeout=getattr(settings, 'ES_CIRCUIT_BREAKER_TIMEOUT', 30))
+
+
+def _circuit_is_open():
+    """Returns whether the circuit breaker for searching is open
+
+    That's the one for ``ES_READ_URLS`` if it's set and ``ES_URLS``
+    otherwise.
+
+    """
+    return (getattr(settings, 'ES_CIRCUIT_BREAKER', False) and
+            get_circuit_breaker(_get_read_urls()).is_open())
+
+
 def es_required(fun):
     """Wrap a callable and return None if ES_DISABLED is False.
 
+    It also returns None without calling the callable if
+    ``ES_CIRCUIT_BREAKER`` is True and the circuit breaker for the
+    cluster it searches is open.
+
     This also adds an additional `es` argument to the callable
-    giving you an ElasticSearch instance to use.
+    giving you an ElasticSearch instance from `get_read_es()` to use.
 
     """
     @wraps(fun)
@@ -59,7 +191,11 @@ def es_required(fun):
             log.debug('Search disabled for %s.' % fun)
             return
 
-        return fun(*args, es=get_es(), **kw)
+        if _circuit_is_open():
+            log.debug('Circuit breaker open for %s.' % fun)
+            return
+
+        return fun(*args, es=get_read_es(), **kw)
     return wrapper
 
 
@@ -70,7 +206,10 @@ class ESExceptionMiddleware(object):
       Returned when ``ES_DISABLED`` is True.
 
     HTTP 503
-      Returned when any elasticsearch exception is thrown.
+      Returned when any elasticsearch exception is thrown or, if
+      ``ES_CIRCUIT_BREAKER`` is True, when the circuit breaker for
+      ``ES_READ_URLS`` (or ``ES_URLS`` if that's not set) is open. In
+      that case, the view isn't called at all.
 
       Template variables:
 
@@ -106,6 +245,11 @@ class ESExceptionMiddleware(object):
             response.status_code = 501
             return response
 
+        if _circuit_is_open():
+            return self.process_exception(request, CircuitOpenError(
+                'N/A', 'Circuit breaker is open; not trying Elasticsearch',
+                None))
+
     def process_exception(self, request, exception):
         if issubclass(exception.__class__, ES_EXCEPTIONS):
             response = render(request, self.error_template,
@@ -161,10 +305,10 @@ class S(BaseS):
         """
         return super(S, self).__init__(mapping_type)
 
-    def get_es(self, default_builder=get_es):
+    def get_es(self, default_builder=get_read_es):
         """Returns the elasticsearch Elasticsearch object to use.
 
-        This uses the django get_es builder by default which takes
+        This uses the django get_read_es builder by default which takes
         into account settings in ``settings.py``.
 
         """
@@ -189,6 +333,21 @@ class S(BaseS):
         return super(S, self).get_doctypes(default_doctypes=doctypes)
 
 
+class MLT(BaseMLT):
+    """MLT that's based on Django settings"""
+    def get_es(self):
+        """Returns the elasticsearch Elasticsearch object to use.
+
+        If there's no s and no es was provided in the constructor, this
+        uses `get_read_es()`.
+
+        """
+        if self.s is not None:
+            return self.s.get_es()
+
+        return self.es or get_read_es()
+
+
 class MappingType(BaseMappingType):
     """MappingType that ties to Django ORM models
 
@@ -206,6 +365,20 @@ class MappingType(BaseMappingType):
         """
         return self.get_model().objects.get(pk=self._id)
 
+    @classmethod
+    def get_objects(cls, ids):
+        """Returns the database objects for a bunch of results
+
+        By default, this is::
+
+            cls.get_model().objects.filter(pk__in=ids)
+
+        :returns: dict of unicode pk -> database object
+
+        """
+        return dict((unicode(obj.pk), obj)
+                    for obj in cls.get_model().objects.filter(pk__in=ids))
+
     @classmethod
     def get_model(cls):
         """Return the model related to this DjangoMappingType.
@@ -270,6 +443,73 @@ class MappingType(BaseMappingType):
         return S(cls)
 
 
+#: Seconds to remember which indexes to write to before looking again.
+#: `reindex()` waits this long after it starts writing to the new
+#: index, so all processes write to it before it gets loaded.
+WRITE_INDEXES_CACHE_TIME = 5
+
+# alias -> (when it expires, list of indexes)
+_write_indexes_cache = {}
+
+
+def get_reindex_alias(alias):
+    """Returns the alias that marks indexes being rebuilt for alias"""
+    return '{0}-reindexing'.format(alias)
+
+
+def get_write_indexes(es, alias):
+    """Returns the indexes that writes to alias should go to
+
+    Those are the indexes the alias points to and the ones being
+    rebuilt by :py:func:`elasticutils.contrib.django.reindex.reindex`.
+    If `alias` isn't an alias, it's just `alias`.
+
+    This remembers what it found for `WRITE_INDEXES_CACHE_TIME`
+    seconds.
+
+    """
+    now = time.time()
+    cached = _write_indexes_cache.get(alias)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    reindex_alias = get_reindex_alias(alias)
+    try:
+        aliases = es.indices.get_alias(
+            name='{0},{1}'.format(alias, reindex_alias))
+    except elasticsearch.NotFoundError:
+        aliases = {}
+
+    live = []
+    rebuilding = []
+    for index, info in sorted(aliases.items()):
+        if alias in info.get('aliases', {}):
+            live.append(index)
+        elif reindex_alias in info.get('aliases', {}):
+            rebuilding.append(index)
+
+    indexes = (live or [alias]) + rebuilding
+    _write_indexes_cache[alias] = (now + WRITE_INDEXES_CACHE_TIME, indexes)
+    return indexes
+
+
+def _extract_documents(mapping_type, ids, chunk_size):
+    """Yields the documents for ids, getting objects chunk_size at a time"""
+    # Get the model this mapping type is based on.
+    model = mapping_type.get_model()
+
+    for id_list in chunked(ids, chunk_size):
+        for obj in model.objects.filter(id__in=id_list):
+            try:
+                doc = mapping_type.extract_document(obj.id, obj)
+            except StandardError as exc:
+                log.exception('Unable to extract document {0}: {1}'.format(
+                        obj, repr(exc)))
+                continue
+            if doc:
+                yield doc
+
+
 class Indexable(BaseIndexable):
     """MappingType mixin that has indexing bits
 
@@ -280,7 +520,10 @@ class Indexable(BaseIndexable):
 
     @classmethod
     def get_es(cls, **overrides):
-        """Returns an ElasticSearch object using Django settings
+        """Returns an ElasticSearch object for indexing using Django settings
+
+        This uses `get_write_es()`, so it talks to ``ES_WRITE_URLS`` if
+        that's set.
 
         Override this if you need special functionality.
 
@@ -291,7 +534,19 @@ class Indexable(BaseIndexable):
         :returns: a elasticsearch `Elasticsearch` instance
 
         """
-        return get_es(**overrides)
+        return get_write_es(**overrides)
+
+    @classmethod
+    def get_write_indexes(cls, es=None):
+        """Returns the indexes to write documents to
+
+        Those are the indexes `get_index()` points to if it's an
+        alias and, while :py:func:`elasticutils.contrib.django.reindex.reindex`
+        rebuilds it, the new index, so writes go to both. See
+        :py:func:`elasticutils.contrib.django.get_write_indexes`.
+
+        """
+        return get_write_indexes(es or cls.get_es(), cls.get_index())
 
     @classmethod
     def get_indexable(cls):
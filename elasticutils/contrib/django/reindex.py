@@ -0,0 +1,180 @@
+"""
+Rebuilds an index without downtime.
+
+`get_index()` of the mapping types should return an alias. This
+builds a new index, loads it and then points the alias at it, so
+searches keep going to the old index until the new one is ready.
+While the new index is built, the Indexable methods write to both.
+
+"""
+import logging
+import time
+from datetime import datetime
+
+from django.conf import settings
+
+from elasticsearch.exceptions import NotFoundError
+
+from elasticutils.contrib.django import (
+    WRITE_INDEXES_CACHE_TIME, _extract_documents, _write_indexes_cache,
+    get_reindex_alias, get_write_es)
+
+
+log = logging.getLogger('elasticutils')
+
+
+def get_new_index_name(alias):
+    """Returns the name of a new index for alias
+
+    This is the alias followed by the time, like
+    ``'myindex-20140314151617'``.
+
+    """
+    return '{0}-{1}'.format(alias, datetime.now().strftime('%Y%m%d%H%M%S'))
+
+
+def reindex(mapping_types, es=None, index_settings=None, chunk_size=100,
+            thread_count=1, optimize=True, delete_old=False):
+    """Rebuilds the index of mapping_types without downtime
+
+    This:
+
+    1. creates a new index with the mappings of `mapping_types`
+    2. marks the new index, so writes through
+       :py:class:`elasticutils.contrib.django.Indexable` go to it as
+       well as the old one, and waits `WRITE_INDEXES_CACHE_TIME`
+       seconds for everyone to notice
+    3. loads everything from `get_indexable()` into it in
+       :py:meth:`elasticutils.Indexable.bulk_load_mode`, optimizing it
+       at the end; documents that got written while it was loading
+       are left alone
+    4. waits for it to be ready
+    5. points the alias at the new index and takes it off the old
+       ones in one go
+    6. deletes the old indexes if `delete_old` is True, after waiting
+       `WRITE_INDEXES_CACHE_TIME` seconds for everyone to stop
+       writing to them
+
+    If something goes wrong, the new index is deleted and the alias
+    is left alone.
+
+    If the alias is an index (it was made by ``create_index``), it's
+    deleted right before the alias is made, so searches fail for a
+    moment that one time.
+
+    :arg mapping_types: list of Indexable MappingType classes that all
+        have the same `get_index()`
+    :arg es: The `Elasticsearch` to use. If you don't specify one, it
+        uses `get_write_es()`.
+    :arg index_settings: Index settings and other index creation
+        arguments. Defaults to ``settings.ES_SETTINGS``. The mappings
+        of `mapping_types` get added to it.
+    :arg chunk_size: how many objects to get from the database at a
+        time
+    :arg thread_count: how many threads send documents to
+        Elasticsearch
+    :arg optimize: whether to optimize the new index before using it
+    :arg delete_old: whether to delete the indexes the alias pointed to
+
+    :returns: the name of the new index
+
+    """
+    aliases = set(mt.get_index() for mt in mapping_types)
+    if len(aliases) != 1:
+        raise ValueError(
+            'mapping_types need to have one index. They have {0}.'.format(
+                ', '.join(sorted(aliases))))
+    alias = aliases.pop()
+
+    if es is None:
+        es = get_write_es()
+    if index_settings is None:
+        index_settings = getattr(settings, 'ES_SETTINGS', None) or {}
+
+    index_settings = dict(index_settings)
+    index_settings['mappings'] = dict(index_settings.get('mappings', {}))
+    for mt in mapping_types:
+        index_settings['mappings'][mt.get_mapping_type_name()] = (
+            mt.get_mapping())
+
+    new_index = get_new_index_name(alias)
+    reindex_alias = get_reindex_alias(alias)
+
+    log.info('Creating {0} for {1}'.format(new_index, alias))
+    es.indices.create(index=new_index, body=index_settings)
+    try:
+        es.indices.put_alias(index=new_index, name=reindex_alias)
+        _write_indexes_cache.pop(alias, None)
+        time.sleep(WRITE_INDEXES_CACHE_TIME)
+
+        with mapping_types[0].bulk_load_mode(es=es, index=new_index,
+                                             optimize=optimize):
+            for mt in mapping_types:
+                _load(mt, es, new_index, chunk_size, thread_count)
+
+        es.cluster.health(index=new_index, wait_for_status='yellow')
+
+        old_indexes = _swap_alias(es, alias, new_index)
+    except Exception:
+        log.exception('Unable to reindex {0}'.format(alias))
+        try:
+            es.indices.delete(index=new_index)
+        except Exception:
+            log.exception('Unable to delete {0}'.format(new_index))
+        raise
+    finally:
+        _write_indexes_cache.pop(alias, None)
+
+    if delete_old and old_indexes:
+        # Other processes write to the old indexes first until they
+        # look up the write indexes again, and those writes fail once
+        # they're gone.
+        time.sleep(WRITE_INDEXES_CACHE_TIME)
+        log.info('Deleting {0}'.format(', '.join(old_indexes)))
+        es.indices.delete(index=','.join(old_indexes))
+
+    return new_index
+
+
+def _load(mapping_type, es, index, chunk_size, thread_count):
+    """Loads everything from get_indexable() into index"""
+    documents = _extract_documents(
+        mapping_type, mapping_type.get_indexable(), chunk_size)
+    # 'create' so documents written since the new index was marked,
+    # which are newer than what gets loaded, win. Updates don't upsert
+    # into the new index, so those are always whole documents.
+    actions = ({'_op_type': 'create', '_id': doc['id'], '_source': doc}
+               for doc in documents)
+    failed = mapping_type.bulk(
+        actions, es=es, index=index, thread_count=thread_count)
+    failed = [result for result in failed if result.status != 409]
+    for result in failed:
+        log.error('Unable to index {0} {1}: {2}'.format(
+            mapping_type.get_mapping_type_name(), result.id, result.error))
+    log.info('Loaded {0} into {1}: {2} failed'.format(
+        mapping_type.get_mapping_type_name(), index, len(failed)))
+
+
+def _swap_alias(es, alias, new_index):
+    """Points alias at new_index only and takes the marker off it
+
+    :returns: list of the indexes alias pointed to
+
+    """
+    try:
+        old_indexes = sorted(es.indices.get_alias(name=alias))
+    except NotFoundError:
+        old_indexes = []
+
+    if not old_indexes and es.indices.exists(index=alias):
+        log.warning('{0} is an index, not an alias. Deleting it.'.format(
+            alias))
+        es.indices.delete(index=alias)
+
+    actions = [{'remove': {'index': index, 'alias': alias}}
+               for index in old_indexes]
+    actions.append({'add': {'index': new_index, 'alias': alias}})
+    actions.append({'remove': {'index': new_index,
+                               'alias': get_reindex_alias(alias)}})
+    es.indices.update_aliases(body={'actions': actions})
+    return old_indexes
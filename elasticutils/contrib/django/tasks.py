@@ -1,16 +1,18 @@
 import logging
 
 from django.conf import settings
+from celery.signals import worker_process_init
 from celery.task import task
+from elasticsearch.helpers import BulkIndexError
 
-from elasticutils.utils import chunked
+from elasticutils.contrib.django import _extract_documents, warm_up
 
 
 log = logging.getLogger('elasticutils')
 
 
 @task
-def index_objects(mapping_type, ids, chunk_size=100):
+def index_objects(mapping_type, ids, chunk_size=100, thread_count=1):
     """Index documents of a specified mapping type.
 
     This allows for asynchronous indexing.
@@ -27,12 +29,24 @@ def index_objects(mapping_type, ids, chunk_size=100):
     :arg mapping_type: the mapping type for these ids
     :arg ids: the list of ids of things to index
     :arg chunk_size: the size of the chunk for bulk indexing
+    :arg thread_count: the number of threads sending bulk requests
+        at the same time
 
     .. Note::
 
        The default chunk_size is 100. The number of documents you can
        bulk index at once depends on the size of the documents.
 
+    .. Note::
+
+       With a thread_count bigger than 1, documents get extracted
+       while earlier chunks are being sent. Reindexing a lot of
+       documents gets faster until Elasticsearch can't keep up.
+
+    :raises: `elasticsearch.helpers.BulkIndexError` if any documents
+        failed, after the rest got indexed; its ``errors`` are the
+        :py:class:`elasticutils.BulkResult` for them
+
     """
     if settings.ES_DISABLED:
         return
@@ -40,25 +54,20 @@ def index_objects(mapping_type, ids, chunk_size=100):
     log.debug('Indexing objects {0}-{1}. [{2}]'.format(
             ids[0], ids[-1], len(ids)))
 
-    # Get the model this mapping type is based on.
-    model = mapping_type.get_model()
-
-    # Retrieve all the objects that we're going to index and do it in
-    # bulk.
-    for id_list in chunked(ids, chunk_size):
-        documents = []
-
-        for obj in model.objects.filter(id__in=id_list):
-            try:
-                doc = mapping_type.extract_document(obj.id, obj)
-                if doc:
-                    documents.append(doc)
-            except StandardError as exc:
-                log.exception('Unable to extract document {0}: {1}'.format(
-                        obj, repr(exc)))
-
-        if documents:
-            mapping_type.bulk_index(documents, id_field='id')
+    documents = _extract_documents(mapping_type, ids, chunk_size)
+    results = mapping_type.streaming_bulk_index(
+        documents, id_field='id', chunk_size=chunk_size,
+        thread_count=thread_count)
+    failed = [result for result in results if not result.ok]
+    for result in failed:
+        log.error('Unable to index {0} {1}: {2}'.format(
+                mapping_type.get_mapping_type_name(), result.id,
+                result.error))
+    if failed:
+        # So Celery sees the task failed and can retry it.
+        raise BulkIndexError(
+            '{0} document(s) failed to index.'.format(len(failed)),
+            failed)
 
 
 @task
@@ -79,5 +88,20 @@ def unindex_objects(mapping_type, ids):
     if settings.ES_DISABLED:
         return
 
-    for id_ in ids:
-        mapping_type.unindex(id_)
+    # Documents that were already gone don't count as failures.
+    for result in mapping_type.bulk_unindex(ids):
+        log.error('Unable to unindex {0} {1}: {2}'.format(
+                mapping_type.get_mapping_type_name(), result.id,
+                result.error))
+
+
+@worker_process_init.connect
+def warm_up_worker(**kwargs):
+    """Warms up Elasticsearch connections when a worker process starts
+
+    This only does something if ``ES_WARMUP`` is True. See
+    :py:func:`elasticutils.contrib.django.warm_up`.
+
+    """
+    if getattr(settings, 'ES_WARMUP', False):
+        warm_up()
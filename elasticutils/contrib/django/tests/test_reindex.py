@@ -0,0 +1,183 @@
+import time
+from unittest import TestCase
+
+from elasticsearch.exceptions import NotFoundError
+from nose.tools import eq_
+
+from elasticutils.contrib.django import _write_indexes_cache, get_write_indexes
+from elasticutils.contrib.django import reindex as reindex_module
+from elasticutils.contrib.django.reindex import reindex
+from elasticutils.contrib.django.tests import (
+    FakeDjangoMappingType, FakeModel, reset_model_cache)
+from elasticutils.tests.test_bulk import FakeBulkES
+
+
+class FakeCalls(object):
+    """Records calls to any method as (name, kwargs)"""
+    def __init__(self, es, responses=None):
+        self.es = es
+        self.responses = responses or {}
+
+    def __getattr__(self, name):
+        def call(**kwargs):
+            self.es.calls.append((name, kwargs))
+            response = self.responses.get(name)
+            if isinstance(response, Exception):
+                raise response
+            if callable(response):
+                return response(**kwargs)
+            return response
+        return call
+
+
+class FakeReindexES(FakeBulkES):
+    def __init__(self, aliases=None, exists=False, responses=None):
+        super(FakeReindexES, self).__init__()
+        self.calls = []
+        indices_responses = {
+            'exists': exists,
+            'get_settings': lambda index: {index: {'settings': {
+                'index.number_of_replicas': '2'}}},
+        }
+        if aliases is None:
+            indices_responses['get_alias'] = NotFoundError(404, 'missing')
+        else:
+            indices_responses['get_alias'] = aliases
+        indices_responses.update(responses or {})
+        self.indices = FakeCalls(self, indices_responses)
+        self.cluster = FakeCalls(self)
+
+    def names(self):
+        return [name for name, kwargs in self.calls]
+
+
+class GetWriteIndexesTest(TestCase):
+    def setUp(self):
+        super(GetWriteIndexesTest, self).setUp()
+        _write_indexes_cache.clear()
+
+    def test_not_an_alias(self):
+        es = FakeReindexES()
+        eq_(get_write_indexes(es, 'test'), ['test'])
+        eq_(es.calls, [('get_alias', {'name': 'test,test-reindexing'})])
+
+    def test_rebuilding(self):
+        es = FakeReindexES(aliases={
+            'test-1': {'aliases': {'test': {}}},
+            'test-2': {'aliases': {'test-reindexing': {}}},
+        })
+        eq_(get_write_indexes(es, 'test'), ['test-1', 'test-2'])
+
+    def test_rebuilding_index(self):
+        es = FakeReindexES(aliases={
+            'test-2': {'aliases': {'test-reindexing': {}}},
+        })
+        eq_(get_write_indexes(es, 'test'), ['test', 'test-2'])
+
+    def test_cached(self):
+        es = FakeReindexES()
+        get_write_indexes(es, 'test')
+        get_write_indexes(es, 'test')
+        eq_(len(es.calls), 1)
+
+
+class ReindexMappingType(FakeDjangoMappingType):
+    @classmethod
+    def get_index(cls):
+        return 'test'
+
+    @classmethod
+    def get_mapping_type_name(cls):
+        return 'doc'
+
+    @classmethod
+    def get_mapping(cls):
+        return {'properties': {'name': {'type': 'string'}}}
+
+
+class ReindexTest(TestCase):
+    def setUp(self):
+        super(ReindexTest, self).setUp()
+        reset_model_cache()
+        _write_indexes_cache.clear()
+        self.cache_time = reindex_module.WRITE_INDEXES_CACHE_TIME
+        reindex_module.WRITE_INDEXES_CACHE_TIME = 0
+        for id_ in (1, 2, 3):
+            FakeModel(id=id_, name='name {0}'.format(id_))
+
+    def tearDown(self):
+        reindex_module.WRITE_INDEXES_CACHE_TIME = self.cache_time
+        super(ReindexTest, self).tearDown()
+
+    def test_reindex(self):
+        es = FakeReindexES(aliases={'test-1': {'aliases': {'test': {}}}})
+        new_index = reindex([ReindexMappingType], es=es, index_settings={
+            'settings': {'number_of_replicas': 2}})
+
+        assert new_index.startswith('test-')
+        eq_(es.names(), ['create', 'put_alias', 'get_settings',
+                         'put_settings', 'optimize', 'put_settings',
+                         'health', 'get_alias', 'update_aliases'])
+        eq_(es.calls[0][1]['body'], {
+            'settings': {'number_of_replicas': 2},
+            'mappings': {'doc': {'properties': {'name': {'type': 'string'}}}},
+        })
+        eq_(es.calls[1][1], {'index': new_index, 'name': 'test-reindexing'})
+        eq_(es.calls[3][1]['body']['index.refresh_interval'], '-1')
+        eq_(es.calls[5][1]['body'], {
+            'index.refresh_interval': '1s',
+            'index.number_of_replicas': '2',
+            'index.translog.flush_threshold_size': '200mb'})
+        eq_(es.calls[-1][1]['body'], {'actions': [
+            {'remove': {'index': 'test-1', 'alias': 'test'}},
+            {'add': {'index': new_index, 'alias': 'test'}},
+            {'remove': {'index': new_index, 'alias': 'test-reindexing'}},
+        ]})
+
+        eq_(len(es.requests), 1)
+        eq_(es.requests[0][0][0],
+            {'create': {'_index': new_index, '_type': 'doc', '_id': 1}})
+        eq_(len(es.requests[0][0]), 6)
+
+    def test_delete_old(self):
+        es = FakeReindexES(aliases={'test-1': {'aliases': {'test': {}}}})
+
+        class FakeTime(object):
+            def sleep(self, seconds):
+                es.calls.append(('sleep', {'seconds': seconds}))
+
+        reindex_module.WRITE_INDEXES_CACHE_TIME = 5
+        reindex_module.time = FakeTime()
+        try:
+            reindex([ReindexMappingType], es=es, optimize=False,
+                    delete_old=True)
+        finally:
+            reindex_module.time = time
+
+        # Other processes get to notice the swap before the old index
+        # goes away.
+        eq_(es.names()[-3:], ['update_aliases', 'sleep', 'delete'])
+        eq_(es.calls[-2][1], {'seconds': 5})
+        eq_(es.calls[-1][1], {'index': 'test-1'})
+
+    def test_replaces_index(self):
+        es = FakeReindexES(exists=True)
+        reindex([ReindexMappingType], es=es)
+        eq_(es.names()[-3:], ['exists', 'delete', 'update_aliases'])
+        eq_(es.calls[-2][1], {'index': 'test'})
+
+    def test_failure(self):
+        es = FakeReindexES(responses={'optimize': ValueError('broken')})
+        self.assertRaises(ValueError, reindex, [ReindexMappingType], es=es)
+        new_index = es.calls[0][1]['index']
+        eq_(es.calls[-1], ('delete', {'index': new_index}))
+
+    def test_one_index(self):
+        class OtherMappingType(ReindexMappingType):
+            @classmethod
+            def get_index(cls):
+                return 'other'
+
+        self.assertRaises(ValueError, reindex,
+                          [ReindexMappingType, OtherMappingType],
+                          es=FakeReindexES())
@@ -1,5 +1,9 @@
+from unittest import TestCase
+
+from elasticsearch.helpers import BulkIndexError
 from nose.tools import eq_
 
+from elasticutils import BulkResult
 from elasticutils.contrib.django import get_es
 from elasticutils.contrib.django.tasks import index_objects, unindex_objects
 from elasticutils.contrib.django.tests import (
@@ -71,3 +75,30 @@ class TestTasks(ESTestCase):
 
         index_objects(MockMappingType, [1, 2, 3], chunk_size=1)
         eq_(MockMappingType.bulk_index_count, 3)
+
+
+class IndexObjectsFailureTest(TestCase):
+    def setUp(self):
+        super(IndexObjectsFailureTest, self).setUp()
+        reset_model_cache()
+        for id_ in (1, 2, 3):
+            FakeModel(id=id_, name='name {0}'.format(id_))
+
+    def test_partial_failure(self):
+        class FailingMappingType(FakeDjangoMappingType):
+            @classmethod
+            def streaming_bulk_index(cls, documents, **kwargs):
+                for doc in documents:
+                    if doc['id'] == 2:
+                        yield BulkResult('index', 'test', 2, False, 503,
+                                         'unavailable')
+                    else:
+                        yield BulkResult('index', 'test', doc['id'], True,
+                                         201, None)
+
+        try:
+            index_objects(FailingMappingType, [1, 2, 3])
+        except BulkIndexError as exc:
+            eq_([result.id for result in exc.errors], [2])
+        else:
+            raise AssertionError('index_objects should have raised')
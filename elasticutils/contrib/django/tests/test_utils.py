@@ -1,2 +1,222 @@
-# TODO: test es_required
+import socket
+from unittest import TestCase
 
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from nose.tools import eq_
+
+from elasticutils import (
+    CircuitBreaker, HttpConnection, LatencySelector, evict_es)
+from elasticutils.contrib.django import (
+    ESExceptionMiddleware, Indexable, MLT, MappingType, S, es_required,
+    get_circuit_breaker, get_es, get_read_es, get_write_es, warm_up)
+
+
+class GetESTest(TestCase):
+    def setUp(self):
+        super(GetESTest, self).setUp()
+        evict_es()
+
+    @override_settings(ES_POOL_MAXSIZE=20, ES_POOL_BLOCK=True,
+                       ES_KEEP_ALIVE=False, ES_CONNECTION_CLASS='urllib3')
+    def test_connection_settings(self):
+        connection = get_es().transport.connection_pool.connections[0]
+        assert isinstance(connection, HttpConnection)
+        eq_(connection.maxsize, 20)
+        eq_(connection.pool.block, True)
+        eq_(connection.keep_alive, False)
+
+    def test_connection_defaults(self):
+        connection = get_es().transport.connection_pool.connections[0]
+        eq_(connection.maxsize, 10)
+        eq_(connection.keep_alive, True)
+
+    @override_settings(ES_SELECTOR_CLASS='latency')
+    def test_selector_setting(self):
+        es = get_es()
+        assert isinstance(es.transport.connection_pool.selector,
+                          LatencySelector)
+
+    @override_settings(ES_COMPRESS=True, ES_COMPRESS_THRESHOLD=512)
+    def test_compress_settings(self):
+        connection = get_es().transport.connection_pool.connections[0]
+        eq_(connection.compress, True)
+        eq_(connection.compress_threshold, 512)
+        eq_(connection.pool.headers['Accept-Encoding'], 'gzip')
+
+
+class RoutingMappingType(MappingType, Indexable):
+    @classmethod
+    def get_mapping_type_name(cls):
+        return 'routing'
+
+
+def get_host(es):
+    return es.transport.connection_pool.connections[0].host
+
+
+class ReadWriteTest(TestCase):
+    def setUp(self):
+        super(ReadWriteTest, self).setUp()
+        evict_es()
+
+    def test_defaults_to_es_urls(self):
+        eq_(get_host(get_read_es()), 'http://localhost:9200')
+        eq_(get_host(get_write_es()), 'http://localhost:9200')
+        eq_(get_read_es(), get_es())
+
+    @override_settings(ES_READ_URLS=['http://read.example.com:9200'],
+                       ES_WRITE_URLS=['http://write.example.com:9200'])
+    def test_read_write_urls(self):
+        eq_(get_host(get_read_es()), 'http://read.example.com:9200')
+        eq_(get_host(get_write_es()), 'http://write.example.com:9200')
+        eq_(get_host(get_es()), 'http://localhost:9200')
+
+        s = S(RoutingMappingType)
+        eq_(get_host(s.get_es()), 'http://read.example.com:9200')
+        eq_(get_host(MLT(1, index='test', doctype='routing').get_es()),
+            'http://read.example.com:9200')
+        eq_(get_host(MLT(1, s=s).get_es()), 'http://read.example.com:9200')
+        eq_(get_host(RoutingMappingType.get_es()),
+            'http://write.example.com:9200')
+
+        # Passing urls still wins.
+        s = s.es(urls=['http://other.example.com:9200'])
+        eq_(get_host(s.get_es()), 'http://other.example.com:9200')
+
+
+warm_up_queries = []
+
+
+class FakeWarmUpS(object):
+    def execute(self):
+        warm_up_queries.append(self)
+
+
+def get_warm_up_query():
+    return FakeWarmUpS()
+
+
+class WarmUpTest(TestCase):
+    def setUp(self):
+        super(WarmUpTest, self).setUp()
+        self.servers = []
+        self.urls = []
+        for i in range(2):
+            server = socket.socket()
+            server.bind(('127.0.0.1', 0))
+            server.listen(10)
+            self.servers.append(server)
+            self.urls.append(
+                '127.0.0.1:{0}'.format(server.getsockname()[1]))
+        del warm_up_queries[:]
+        evict_es()
+
+    def tearDown(self):
+        for server in self.servers:
+            server.close()
+        evict_es()
+        super(WarmUpTest, self).tearDown()
+
+    def test_warm_up(self):
+        with override_settings(
+                ES_URLS=self.urls[:1], ES_WARMUP_CONNECTIONS=2,
+                ES_WARMUP_QUERIES=[__name__ + '.get_warm_up_query']):
+            eq_(warm_up(), 2)
+        eq_(len(warm_up_queries), 1)
+
+    def test_read_and_write_urls(self):
+        with override_settings(ES_READ_URLS=self.urls[:1],
+                               ES_WRITE_URLS=self.urls[1:]):
+            eq_(warm_up(), 2)
+
+    def test_disabled(self):
+        with override_settings(ES_DISABLED=True, ES_URLS=self.urls[:1]):
+            eq_(warm_up(), 0)
+
+
+class CircuitBreakerTest(TestCase):
+    def setUp(self):
+        super(CircuitBreakerTest, self).setUp()
+        self.override = override_settings(
+            ES_CIRCUIT_BREAKER=True,
+            ES_URLS=['http://circuit.example.com:9200'])
+        self.override.enable()
+        evict_es()
+        self.breaker = get_circuit_breaker()
+        self.breaker.record_success()
+
+    def tearDown(self):
+        self.breaker.record_success()
+        self.override.disable()
+        super(CircuitBreakerTest, self).tearDown()
+
+    def open_breaker(self):
+        for i in range(self.breaker.failure_threshold):
+            self.breaker.record_failure()
+
+    def test_get_es(self):
+        es = get_es()
+        assert es.transport.circuit_breaker is self.breaker
+
+    def test_middleware(self):
+        request = RequestFactory().get('/')
+        eq_(ESExceptionMiddleware().process_request(request), None)
+
+        self.open_breaker()
+        response = ESExceptionMiddleware().process_request(request)
+        eq_(response.status_code, 503)
+
+    def test_es_required(self):
+        calls = []
+
+        @es_required
+        def search(es):
+            calls.append(es)
+            return 'results'
+
+        eq_(search(), 'results')
+        self.open_breaker()
+        eq_(search(), None)
+        eq_(len(calls), 1)
+
+    def test_read_urls(self):
+        calls = []
+
+        @es_required
+        def search(es):
+            calls.append(es)
+
+        request = RequestFactory().get('/')
+        with override_settings(
+                ES_READ_URLS=['http://circuit-read.example.com:9200']):
+            read_breaker = get_circuit_breaker(
+                ['http://circuit-read.example.com:9200'])
+            try:
+                search()
+                eq_(calls, [get_read_es()])
+                assert calls[0] is not get_es()
+
+                # The read cluster's breaker is the one that counts.
+                self.open_breaker()
+                search()
+                eq_(ESExceptionMiddleware().process_request(request), None)
+                eq_(len(calls), 2)
+
+                self.breaker.record_success()
+                for i in range(read_breaker.failure_threshold):
+                    read_breaker.record_failure()
+                search()
+                eq_(len(calls), 2)
+                response = ESExceptionMiddleware().process_request(request)
+                eq_(response.status_code, 503)
+            finally:
+                read_breaker.record_success()
+
+    @override_settings(ES_CIRCUIT_BREAKER_THRESHOLD=2,
+                       ES_URLS=['http://circuit2.example.com:9200'])
+    def test_settings(self):
+        breaker = get_circuit_breaker()
+        assert isinstance(breaker, CircuitBreaker)
+        eq_(breaker.failure_threshold, 2)
+        eq_(breaker.reset_timeout, 30)
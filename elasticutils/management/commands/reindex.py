@@ -0,0 +1,67 @@
+import inspect
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.utils.module_loading import module_has_submodule
+
+try:
+    import importlib
+except ImportError:
+    # Python 2.6
+    from django.utils import importlib
+
+from elasticutils.contrib.django import Indexable, MappingType
+from elasticutils.contrib.django.reindex import reindex
+
+
+class Command(BaseCommand):
+
+    help = 'Rebuilds indexes for elastic search without downtime'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', type='int', dest='chunk_size',
+                    default=100,
+                    help='How many objects to get from the database at '
+                         'a time'),
+        make_option('--threads', type='int', dest='thread_count',
+                    default=1,
+                    help='How many threads send documents to elastic '
+                         'search'),
+        make_option('--no-optimize', action='store_false', dest='optimize',
+                    default=True,
+                    help='Don\'t optimize the new indexes'),
+        make_option('--delete-old', action='store_true', dest='delete_old',
+                    default=False,
+                    help='Delete the indexes the aliases pointed to'),
+    )
+
+    def handle(self, *args, **options):
+        # index -> list of mapping types
+        indexes = {}
+        for app in settings.INSTALLED_APPS:
+            mod = importlib.import_module(app)
+
+            try:
+                search_index_module = importlib.import_module(
+                    "%s.mappings" % app)
+            except ImportError:
+                if module_has_submodule(mod, 'mappings'):
+                    raise
+
+                continue
+            for item_name, item in inspect.getmembers(
+                    search_index_module, inspect.isclass):
+                if (issubclass(item, Indexable) and
+                        issubclass(item, MappingType) and
+                        item.__module__ == search_index_module.__name__):
+                    indexes.setdefault(item.get_index(), []).append(item)
+
+        for index, mapping_types in sorted(indexes.items()):
+            new_index = reindex(
+                mapping_types,
+                chunk_size=options['chunk_size'],
+                thread_count=options['thread_count'],
+                optimize=options['optimize'],
+                delete_old=options['delete_old'])
+            self.stdout.write('{0} -> {1}\n'.format(index, new_index))
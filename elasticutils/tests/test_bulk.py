@@ -0,0 +1,430 @@
+import json
+import threading
+import time
+from unittest import TestCase
+
+from elasticsearch.exceptions import ConnectionError, TransportError
+from elasticsearch.serializer import JSONSerializer
+from nose.tools import eq_
+
+from elasticutils import (
+    BulkResult, Indexable, MappingType, streaming_bulk)
+
+
+class FakeTransport(object):
+    serializer = JSONSerializer()
+
+
+class FakeBulkES(object):
+    """Elasticsearch that answers bulk requests from a list of responses
+
+    Each response is a dict of id -> status, an exception to raise or
+    None for every action working.
+
+    """
+    transport = FakeTransport()
+
+    def __init__(self, responses=()):
+        self.responses = list(responses)
+        self.requests = []
+        self.threads = []
+
+    def bulk(self, body, **params):
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.requests.append((lines, params))
+        self.threads.append(threading.current_thread())
+
+        response = self.responses.pop(0) if self.responses else None
+        if isinstance(response, Exception):
+            raise response
+
+        items = []
+        for line in lines:
+            if len(line) != 1 or line.keys()[0] not in (
+                    'index', 'create', 'update', 'delete'):
+                continue
+            op_type, meta = line.items()[0]
+            id_ = meta.get('_id', 'generated')
+            status = (response or {}).get(id_, 200)
+            info = {'_id': id_, 'status': status}
+            if op_type == 'delete' and status == 404:
+                info['found'] = False
+            elif status >= 300:
+                info['error'] = 'Error {0}'.format(status)
+            items.append({op_type: info})
+        return {'items': items}
+
+    def ids(self, request):
+        return [line['index']['_id'] for line in self.requests[request][0]
+                if 'index' in line]
+
+
+def make_actions(ids, size=10):
+    return [{'_index': 'test', '_type': 'doc', '_id': id_,
+             '_source': {'text': 'x' * size}}
+            for id_ in ids]
+
+
+class StreamingBulkTest(TestCase):
+    def test_chunk_size(self):
+        es = FakeBulkES()
+        results = list(streaming_bulk(es, make_actions(range(5)),
+                                      chunk_size=2))
+        eq_(len(es.requests), 3)
+        eq_([es.ids(i) for i in range(3)], [[0, 1], [2, 3], [4]])
+        eq_(results[0], BulkResult('index', 'test', 0, True, 200, None))
+        eq_(len(results), 5)
+
+    def test_max_chunk_bytes(self):
+        es = FakeBulkES()
+        actions = (make_actions([0, 1], size=10) +
+                   make_actions([2], size=1000) +
+                   make_actions([3], size=10))
+        list(streaming_bulk(es, actions, max_chunk_bytes=500))
+        # The big one goes by itself.
+        eq_([es.ids(i) for i in range(3)], [[0, 1], [2], [3]])
+
+    def test_streams_actions(self):
+        es = FakeBulkES()
+
+        def actions():
+            for action in make_actions(range(4)):
+                yield action
+                # The first chunk was sent before the rest were made.
+                if action['_id'] == 3:
+                    eq_(len(es.requests), 1)
+
+        list(streaming_bulk(es, actions(), chunk_size=2))
+
+    def test_retries_rejected_items(self):
+        es = FakeBulkES([{1: 429, 2: 400}, {1: 429}, None])
+        results = list(streaming_bulk(es, make_actions(range(3)),
+                                      retry_backoff=0))
+        eq_([es.ids(i) for i in range(3)], [[0, 1, 2], [1], [1]])
+        eq_(sorted((result.id, result.ok) for result in results),
+            [(0, True), (1, True), (2, False)])
+        eq_(results[1],
+            BulkResult('index', 'test', 2, False, 400, 'Error 400'))
+
+    def test_gives_up(self):
+        es = FakeBulkES([{0: 503}, {0: 503}])
+        results = list(streaming_bulk(es, make_actions([0]), max_retries=1,
+                                      retry_backoff=0))
+        eq_(len(es.requests), 2)
+        eq_(results,
+            [BulkResult('index', 'test', 0, False, 503, 'Error 503')])
+
+    def test_request_errors(self):
+        es = FakeBulkES([ConnectionError('N/A', 'timed out', None),
+                         TransportError(400, 'bad request'), None])
+        results = list(streaming_bulk(es, make_actions([0, 1]),
+                                      retry_backoff=0))
+        # Connection errors get tried again, other errors don't.
+        eq_(len(es.requests), 2)
+        eq_([(result.id, result.ok, result.status) for result in results],
+            [(0, False, 400), (1, False, 400)])
+
+    def test_params(self):
+        es = FakeBulkES()
+        list(streaming_bulk(es, make_actions([0]), refresh=True))
+        eq_(es.requests[0][1], {'refresh': True})
+
+
+class BlockingBulkES(FakeBulkES):
+    def __init__(self):
+        super(BlockingBulkES, self).__init__()
+        self.event = threading.Event()
+
+    def bulk(self, body, **params):
+        self.event.wait()
+        return super(BlockingBulkES, self).bulk(body, **params)
+
+
+class BrokenBulkES(FakeBulkES):
+    def bulk(self, body, **params):
+        raise ValueError('broken')
+
+
+class ParallelBulkTest(TestCase):
+    def test_results(self):
+        es = FakeBulkES()
+        results = list(streaming_bulk(es, make_actions(range(100)),
+                                      chunk_size=5, thread_count=4))
+        eq_(sorted(result.id for result in results), range(100))
+        eq_(len(es.requests), 20)
+        assert len(set(es.threads)) > 1
+
+    def test_same_id_same_thread(self):
+        es = FakeBulkES()
+        actions = make_actions(range(20)) + make_actions(range(20))
+        list(streaming_bulk(es, actions, chunk_size=3, thread_count=4))
+
+        threads = {}
+        for request, thread in enumerate(es.threads):
+            for id_ in es.ids(request):
+                eq_(threads.setdefault(id_, thread), thread)
+
+    def test_backpressure(self):
+        es = BlockingBulkES()
+        made = []
+
+        def actions():
+            for action in make_actions(range(100)):
+                made.append(action)
+                yield action
+
+        thread = threading.Thread(target=lambda: list(streaming_bulk(
+            es, actions(), chunk_size=1, thread_count=2, queue_size=1)))
+        thread.start()
+        time.sleep(0.1)
+        # Each worker has one chunk it's sending, one queued and one
+        # waiting to be queued, and there's one being put together.
+        assert len(made) < 10, len(made)
+
+        es.event.set()
+        thread.join()
+        eq_(len(made), 100)
+        eq_(len(es.requests), 100)
+
+    def test_errors(self):
+        es = BrokenBulkES()
+        self.assertRaises(ValueError, list, streaming_bulk(
+            es, make_actions(range(10)), chunk_size=1, thread_count=2))
+
+
+class FakeIndexable(MappingType, Indexable):
+    @classmethod
+    def get_index(cls):
+        return 'test'
+
+    @classmethod
+    def get_mapping_type_name(cls):
+        return 'doc'
+
+
+class StreamingBulkIndexTest(TestCase):
+    def test_streaming_bulk_index(self):
+        es = FakeBulkES([{2: 400}])
+        documents = [{'id': 1, 'text': 'one'}, {'id': 2, 'text': 'two'}]
+        results = list(FakeIndexable.streaming_bulk_index(documents, es=es))
+        eq_([result.ok for result in results], [True, False])
+        eq_(es.requests[0][0], [
+            {'index': {'_index': 'test', '_type': 'doc', '_id': 1}},
+            {'id': 1, 'text': 'one'},
+            {'index': {'_index': 'test', '_type': 'doc', '_id': 2}},
+            {'id': 2, 'text': 'two'},
+        ])
+
+    def test_bulk(self):
+        es = FakeBulkES([{3: 409}])
+        failed = FakeIndexable.bulk([
+            {'_op_type': 'index', '_id': 1, '_source': {'text': 'one'}},
+            {'_op_type': 'update', '_id': 2, 'doc': {'text': 'two'}},
+            {'_op_type': 'create', '_id': 3, '_source': {'text': 'three'}},
+            {'_op_type': 'delete', '_id': 4, '_index': 'other'},
+        ], es=es)
+        eq_(failed,
+            [BulkResult('create', 'test', 3, False, 409, 'Error 409')])
+        eq_(len(es.requests), 1)
+        eq_(es.requests[0][0], [
+            {'index': {'_index': 'test', '_type': 'doc', '_id': 1}},
+            {'text': 'one'},
+            {'update': {'_index': 'test', '_type': 'doc', '_id': 2}},
+            {'doc': {'text': 'two'}},
+            {'create': {'_index': 'test', '_type': 'doc', '_id': 3}},
+            {'text': 'three'},
+            {'delete': {'_index': 'other', '_type': 'doc', '_id': 4}},
+        ])
+
+    def test_bulk_unindex(self):
+        es = FakeBulkES([{2: 404, 3: 500}])
+        failed = FakeIndexable.bulk_unindex([1, 2, 3], es=es)
+        eq_(failed,
+            [BulkResult('delete', 'test', 3, False, 500, 'Error 500')])
+        eq_(es.requests[0][0], [
+            {'delete': {'_index': 'test', '_type': 'doc', '_id': 1}},
+            {'delete': {'_index': 'test', '_type': 'doc', '_id': 2}},
+            {'delete': {'_index': 'test', '_type': 'doc', '_id': 3}},
+        ])
+
+
+class DualWriteIndexable(FakeIndexable):
+    @classmethod
+    def get_write_indexes(cls, es=None):
+        return ['test', 'test-new']
+
+
+class DualWriteTest(TestCase):
+    def test_bulk(self):
+        es = FakeBulkES([{1: 500, 2: 500}])
+        failed = DualWriteIndexable.bulk([
+            {'_op_type': 'index', '_id': 1, '_source': {'text': 'one'}},
+            {'_op_type': 'delete', '_id': 2},
+            {'_op_type': 'index', '_source': {'text': 'no id'}},
+            {'_op_type': 'index', '_id': 3, '_index': 'other',
+             '_source': {'text': 'three'}},
+        ], es=es)
+        # Only failures writing to the first index count.
+        eq_(failed, [
+            BulkResult('index', 'test', 1, False, 500, 'Error 500'),
+            BulkResult('delete', 'test', 2, False, 500, 'Error 500'),
+        ])
+        eq_([line.values()[0]['_index'] for line in es.requests[0][0]
+             if len(line) == 1 and line.keys()[0] in ('index', 'delete')],
+            ['test', 'test-new', 'test', 'test-new', 'test', 'other'])
+
+    def test_update(self):
+        es = FakeUpdateES()
+        DualWriteIndexable.update(1, {'views': 5}, es=es)
+        eq_([update['index'] for update in es.updates], ['test', 'test-new'])
+
+        es = FakeUpdateES()
+        DualWriteIndexable.update(1, {'views': 5}, es=es, index='other')
+        eq_([update['index'] for update in es.updates], ['other'])
+
+    def test_no_upserts_to_rebuilding_indexes(self):
+        # An upsert would make a partial document the load leaves be.
+        es = FakeUpdateES()
+        DualWriteIndexable.script_update(
+            1, 'ctx._source.views += 1', upsert={'views': 1}, es=es)
+        eq_([(update['index'], update['body']) for update in es.updates], [
+            ('test', {'script': 'ctx._source.views += 1',
+                      'upsert': {'views': 1}}),
+            ('test-new', {'script': 'ctx._source.views += 1'}),
+        ])
+
+        es = FakeBulkES()
+        DualWriteIndexable.bulk([
+            dict(DualWriteIndexable.update_action(1, {'views': 5}),
+                 doc_as_upsert=True),
+        ], es=es)
+        eq_(es.requests[0][0], [
+            {'update': {'_index': 'test', '_type': 'doc', '_id': 1}},
+            {'doc': {'views': 5}, 'doc_as_upsert': True},
+            {'update': {'_index': 'test-new', '_type': 'doc', '_id': 1}},
+            {'doc': {'views': 5}},
+        ])
+
+
+class FakeUpdateES(object):
+    def __init__(self):
+        self.updates = []
+
+    def update(self, **kwargs):
+        self.updates.append(kwargs)
+
+
+class UpdateTest(TestCase):
+    def test_update(self):
+        es = FakeUpdateES()
+        FakeIndexable.update(1, {'views': 5}, es=es, retry_on_conflict=3)
+        FakeIndexable.update(2, {'views': 1}, upsert={'id': 2, 'views': 1},
+                             es=es, index='other')
+        eq_(es.updates, [
+            {'index': 'test', 'doc_type': 'doc', 'id': 1,
+             'body': {'doc': {'views': 5}}, 'retry_on_conflict': 3},
+            {'index': 'other', 'doc_type': 'doc', 'id': 2,
+             'body': {'doc': {'views': 1}, 'upsert': {'id': 2, 'views': 1}}},
+        ])
+
+    def test_script_update(self):
+        es = FakeUpdateES()
+        FakeIndexable.script_update(1, 'ctx._source.views += n',
+                                    params={'n': 1}, es=es)
+        eq_(es.updates, [
+            {'index': 'test', 'doc_type': 'doc', 'id': 1,
+             'body': {'script': 'ctx._source.views += n',
+                      'params': {'n': 1}}},
+        ])
+
+    def test_bulk_updates(self):
+        es = FakeBulkES()
+        failed = FakeIndexable.bulk([
+            FakeIndexable.update_action(1, {'views': 5}),
+            FakeIndexable.script_update_action(
+                2, 'ctx._source.views += 1', upsert={'views': 1}),
+        ], es=es)
+        eq_(failed, [])
+        eq_(es.requests[0][0], [
+            {'update': {'_index': 'test', '_type': 'doc', '_id': 1}},
+            {'doc': {'views': 5}},
+            {'update': {'_index': 'test', '_type': 'doc', '_id': 2}},
+            {'script': 'ctx._source.views += 1', 'upsert': {'views': 1}},
+        ])
+
+
+class FakeSettingsES(object):
+    def __init__(self, settings):
+        self.settings = settings
+        self.calls = []
+
+    def get_settings(self, index):
+        return self.settings
+
+    def put_settings(self, index, body):
+        self.calls.append(('put_settings', index, body))
+
+    def optimize(self, index, max_num_segments):
+        self.calls.append(('optimize', index, max_num_segments))
+
+    @property
+    def indices(self):
+        return self
+
+
+class BulkLoadModeTest(TestCase):
+    def test_restores_settings(self):
+        es = FakeSettingsES({
+            # Elasticsearch 1.0 nests settings, 0.90 doesn't.
+            'test-1': {'settings': {'index': {'number_of_replicas': '2',
+                                              'refresh_interval': '30s'}}},
+            'test-2': {'settings': {'index.number_of_replicas': '1'}},
+        })
+        with FakeIndexable.bulk_load_mode(es=es, optimize=True):
+            eq_(es.calls, [('put_settings', 'test', {
+                'index.refresh_interval': '-1',
+                'index.number_of_replicas': 0,
+                'index.translog.flush_threshold_size': '1gb'})])
+
+        eq_(es.calls[1:], [
+            ('optimize', 'test', 1),
+            ('put_settings', 'test-1', {
+                'index.refresh_interval': '30s',
+                'index.number_of_replicas': '2',
+                'index.translog.flush_threshold_size': '200mb'}),
+            ('put_settings', 'test-2', {
+                'index.refresh_interval': '1s',
+                'index.number_of_replicas': '1',
+                'index.translog.flush_threshold_size': '200mb'}),
+        ])
+
+    def test_error(self):
+        es = FakeSettingsES({'test': {'settings': {
+            'index.merge.policy.segments_per_tier': '10'}}})
+        settings = {'index.merge.policy.segments_per_tier': 50}
+
+        def load():
+            with FakeIndexable.bulk_load_mode(es=es, settings=settings,
+                                              optimize=True):
+                raise ValueError('broken')
+
+        self.assertRaises(ValueError, load)
+        eq_(es.calls[0][2]['index.merge.policy.segments_per_tier'], 50)
+        # Settings are put back, but it doesn't optimize.
+        eq_(es.calls[1:], [('put_settings', 'test', {
+            'index.refresh_interval': '1s',
+            'index.number_of_replicas': 1,
+            'index.translog.flush_threshold_size': '200mb',
+            'index.merge.policy.segments_per_tier': '10'})])
+
+    def test_unknown_settings(self):
+        es = FakeSettingsES({'test': {'settings': {}}})
+        settings = {'index.merge.policy.segments_per_tier': 50}
+
+        def load():
+            with FakeIndexable.bulk_load_mode(es=es, settings=settings):
+                pass
+
+        # There'd be nothing to put back, so nothing gets changed.
+        self.assertRaises(ValueError, load)
+        eq_(es.calls, [])
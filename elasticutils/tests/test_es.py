@@ -1,8 +1,23 @@
+import gzip
+import os
+import socket
+import sys
+import threading
+import time
+from cStringIO import StringIO
 from unittest import TestCase
 
+from elasticsearch.exceptions import (
+    ConnectionError, NotFoundError, TransportError)
 from nose.tools import eq_
 
-from elasticutils import get_es, _cached_elasticsearch
+import elasticutils
+from elasticutils import (
+    CircuitBreaker, CircuitBreakerTransport, CircuitOpenError,
+    DeadlineExceeded, HttpConnection, LatencySelector, MLT, S, Sniffer,
+    deadline, evict_es, get_circuit_breaker, get_es, get_pool_stats,
+    get_remaining_time, warm_up, _cached_elasticsearch, _get_owner,
+    _is_node_failure)
 
 
 class ESTest(TestCase):
@@ -62,3 +77,692 @@ class ESTest(TestCase):
         es3 = get_es(max_retries=4, revival_delay=10)
         eq_(len(_cached_elasticsearch), 2)
         assert id(es) != id(es3)
+
+    def test_evict_es(self):
+        es = get_es()
+        es2 = get_es(timeout=10)
+
+        evict_es(es)
+        eq_(_cached_elasticsearch.values(), [es2])
+        assert get_es() is not es
+
+        evict_es()
+        eq_(len(_cached_elasticsearch), 0)
+
+    def test_cache_size(self):
+        old_size = elasticutils.ES_CACHE_SIZE
+        elasticutils.ES_CACHE_SIZE = 2
+        try:
+            es = get_es(timeout=1)
+            get_es(timeout=2)
+            get_es(timeout=3)
+            eq_(len(_cached_elasticsearch), 2)
+
+            # The oldest one got dropped.
+            assert get_es(timeout=1) is not es
+            eq_(len(_cached_elasticsearch), 2)
+        finally:
+            elasticutils.ES_CACHE_SIZE = old_size
+
+    def test_get_es_after_fork(self):
+        es = get_es()
+        old_pid = elasticutils._cached_elasticsearch_pid
+        # Pretend this process is a child of the one that created es.
+        elasticutils._cached_elasticsearch_pid = -1
+        try:
+            es2 = get_es()
+            assert es2 is not es
+            eq_(_cached_elasticsearch.values(), [es2])
+            assert get_es() is es2
+        finally:
+            elasticutils._cached_elasticsearch_pid = old_pid
+
+    def test_get_es_threads(self):
+        results = []
+
+        def get():
+            results.append(get_es(urls=['http://example.com:9200']))
+
+        threads = [threading.Thread(target=get) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        eq_(len(set(id(es) for es in results)), 1)
+        eq_(len(_cached_elasticsearch), 1)
+
+    def test_get_es_unhashable_settings(self):
+        es = get_es(sniff_hosts=['a', 'b'], max_retries=3)
+        es2 = get_es(max_retries=3, sniff_hosts=['a', 'b'])
+        assert es is es2
+        assert get_es(sniff_hosts=['a'], max_retries=3) is not es
+
+
+class SGetESTest(TestCase):
+    def setUp(self):
+        super(SGetESTest, self).setUp()
+        self.calls = []
+
+    def builder(self, **settings):
+        self.calls.append(settings)
+        return object()
+
+    def test_shared_with_clones(self):
+        s = S().es(timeout=10)
+        es = s.get_es(default_builder=self.builder)
+        s2 = s.query(foo='bar').filter(baz=1)[:10]
+        assert s2.get_es(default_builder=self.builder) is es
+        eq_(self.calls, [{'timeout': 10}])
+
+    def test_es_settings_change(self):
+        s = S().es(timeout=10)
+        es = s.get_es(default_builder=self.builder)
+        s2 = s.es(urls=['http://example.com:9200'])
+        assert s2.get_es(default_builder=self.builder) is not es
+        eq_(self.calls, [{'timeout': 10},
+                         {'timeout': 10,
+                          'urls': ['http://example.com:9200']}])
+
+    def test_evict_es(self):
+        s = S()
+        es = s.get_es(default_builder=self.builder)
+        s2 = s.query(foo='bar')
+        evict_es(es)
+        assert s.get_es(default_builder=self.builder) is not es
+        assert s2.get_es(default_builder=self.builder) is not es
+        eq_(len(self.calls), 3)
+
+    def test_not_shared_after_fork(self):
+        s = S()
+        es = s.get_es(default_builder=self.builder)
+        # Pretend s was created in the parent of this process.
+        s._es = ((-1, None), es)
+        assert s.get_es(default_builder=self.builder) is not es
+
+    def test_not_shared_across_hubs(self):
+        s = S()
+        es = s.get_es(default_builder=self.builder)
+        # Pretend s was created in another gevent hub.
+        s._es = ((os.getpid(), object()), es)
+        assert s.get_es(default_builder=self.builder) is not es
+
+
+class ConnectionTest(TestCase):
+    def setUp(self):
+        super(ConnectionTest, self).setUp()
+        _cached_elasticsearch.clear()
+
+    def get_connection(self, es):
+        return es.transport.connection_pool.connections[0]
+
+    def test_default_connection_class(self):
+        connection = self.get_connection(get_es())
+        assert isinstance(connection, HttpConnection)
+        eq_(connection.maxsize, 10)
+        eq_(connection.pool.block, False)
+        eq_(connection.pool.headers['Connection'], 'keep-alive')
+
+    def test_pool_settings(self):
+        es = get_es(maxsize=25, block=True, keep_alive=False)
+        connection = self.get_connection(es)
+        eq_(connection.pool.pool.maxsize, 25)
+        eq_(connection.pool.block, True)
+        eq_(connection.pool.headers['Connection'], 'close')
+
+        # Different pool settings, different Elasticsearch.
+        assert get_es(maxsize=30) is not es
+
+    def test_connection_class_names(self):
+        class MyConnection(HttpConnection):
+            pass
+
+        es = get_es(connection_class='urllib3')
+        assert get_es() is es
+        assert type(self.get_connection(es)) is HttpConnection
+
+        es = get_es(connection_class=MyConnection)
+        assert type(self.get_connection(es)) is MyConnection
+
+        es = get_es(connection_class='elasticutils.HttpConnection')
+        assert type(self.get_connection(es)) is HttpConnection
+
+        self.assertRaises(ValueError, get_es, connection_class='foo')
+
+    def test_pool_stats(self):
+        es = get_es(urls=['localhost:9200', 'example.com:9200'], maxsize=5)
+        stats = get_pool_stats(es)
+        eq_(sorted(item['host'] for item in stats),
+            ['http://example.com:9200', 'http://localhost:9200'])
+        eq_(stats[0]['maxsize'], 5)
+        eq_(stats[0]['idle'], 0)
+        eq_(stats[0]['connections_created'], 0)
+        eq_(stats[0]['requests'], 0)
+        eq_(stats[0]['in_flight'], 0)
+
+    def test_record_stats(self):
+        connection = HttpConnection()
+        eq_(connection.latency, None)
+        connection.in_flight = 2
+        connection._record(1.0, False)
+        eq_(connection.latency, 1.0)
+        connection._record(2.0, True)
+        eq_(connection.latency, 1.2)
+        eq_(connection.error_rate, 0.2)
+        eq_(connection.in_flight, 0)
+
+        connection.reset_stats()
+        eq_(connection.latency, None)
+        eq_(connection.error_rate, 0.0)
+
+    def test_perform_stream_request(self):
+        connection = HttpConnection()
+        responses = [FakeStreamResponse(200, ['{"hits"', ': []}']),
+                     FakeStreamResponse(404, ['{"error": "missing"}'])]
+        calls = []
+
+        def urlopen(method, url, body, **kw):
+            calls.append(kw)
+            return responses.pop(0)
+
+        connection.pool.urlopen = urlopen
+        chunks = connection.perform_stream_request('GET', '/_search')
+        eq_(list(chunks), [u'{"hits"', u': []}'])
+        eq_(calls[0]['preload_content'], False)
+
+        self.assertRaises(NotFoundError, connection.perform_stream_request,
+                          'GET', '/_search')
+        eq_(connection.num_requests, 2)
+        eq_(connection.num_errors, 1)
+        eq_(connection.samples, 2)
+        eq_(connection.in_flight, 0)
+
+    def test_is_node_failure(self):
+        eq_(_is_node_failure(ConnectionError('N/A', 'refused', None)), True)
+        eq_(_is_node_failure(TransportError(503, 'unavailable')), True)
+        eq_(_is_node_failure(NotFoundError(404, 'missing')), False)
+        # A query 0.90 couldn't parse.
+        eq_(_is_node_failure(TransportError(
+            500, 'SearchPhaseExecutionException[Failed to execute phase '
+            '[query], all shards failed]')), False)
+
+    def test_selector_setting(self):
+        es = get_es(urls=['a:9200', 'b:9200'], selector_class='latency')
+        assert isinstance(es.transport.connection_pool.selector,
+                          LatencySelector)
+
+
+class FakeStatsConnection(object):
+    def __init__(self, name, latency=None, error_rate=0.0, samples=None):
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        if samples is None:
+            samples = 0 if latency is None else 100
+        self.samples = samples
+
+    def reset_stats(self):
+        self.latency = None
+        self.error_rate = 0.0
+        self.samples = 0
+
+
+class LatencySelectorTest(TestCase):
+    def select_many(self, selector, connections, times=50):
+        return set(selector.select(connections).name for i in range(times))
+
+    def test_prefers_fast_nodes(self):
+        connections = [FakeStatsConnection('fast', 0.01),
+                       FakeStatsConnection('fast2', 0.012),
+                       FakeStatsConnection('slow', 0.02)]
+        selector = LatencySelector({})
+        # Picks the faster of two random nodes, so the slowest never
+        # gets picked.
+        eq_(self.select_many(selector, connections), set(['fast', 'fast2']))
+        eq_(selector.ejected, {})
+
+    def test_ejects_slow_and_failing_nodes(self):
+        slow = FakeStatsConnection('slow', 1.0)
+        failing = FakeStatsConnection('failing', 0.01, error_rate=0.6)
+        connections = [FakeStatsConnection('ok', 0.1), slow, failing]
+        selector = LatencySelector({})
+        eq_(self.select_many(selector, connections), set(['ok']))
+        eq_(sorted(c.name for c in selector.ejected), ['failing', 'slow'])
+
+        # Once the timeout's up, they get another chance with fresh
+        # stats.
+        for connection in selector.ejected:
+            selector.ejected[connection] = 0
+        selector.select(connections)
+        eq_(selector.ejected, {})
+        eq_(slow.latency, None)
+        eq_(failing.error_rate, 0.0)
+
+    def test_fast_nodes_kept(self):
+        # 3ms is three times 1ms, but that's just jitter.
+        connections = [FakeStatsConnection('a', 0.001),
+                       FakeStatsConnection('b', 0.003),
+                       FakeStatsConnection('c', 0.002)]
+        selector = LatencySelector({})
+        self.select_many(selector, connections)
+        eq_(selector.ejected, {})
+
+    def test_few_samples_not_ejected(self):
+        connections = [FakeStatsConnection('ok', 0.1),
+                       FakeStatsConnection('slow', 5.0, samples=1),
+                       FakeStatsConnection('failing', 0.1, error_rate=1.0,
+                                           samples=2)]
+        selector = LatencySelector({})
+        self.select_many(selector, connections)
+        eq_(selector.ejected, {})
+
+    def test_unknown_nodes_count_as_fast(self):
+        connections = [FakeStatsConnection('new'),
+                       FakeStatsConnection('slow', 5.0)]
+        eq_(self.select_many(LatencySelector({}), connections),
+            set(['new']))
+
+    def test_all_ejected(self):
+        connections = [FakeStatsConnection('a', 0.1, error_rate=1.0),
+                       FakeStatsConnection('b', 0.1, error_rate=1.0)]
+        eq_(self.select_many(LatencySelector({}), connections),
+            set(['a', 'b']))
+
+
+class FakeSniffTransport(object):
+    def __init__(self):
+        self.sniffed = threading.Event()
+
+    def sniff_hosts(self):
+        self.sniffed.set()
+        raise ConnectionError('N/A', 'refused', None)
+
+
+class SnifferTest(TestCase):
+    def test_sniffs_in_background(self):
+        transport = FakeSniffTransport()
+        sniffer = Sniffer(transport, 0.01)
+        sniffer.start()
+        transport.sniffed.wait(5)
+        assert transport.sniffed.is_set()
+        # Keeps going after errors.
+        transport.sniffed.clear()
+        transport.sniffed.wait(5)
+        assert transport.sniffed.is_set()
+
+        sniffer.stop()
+        sniffer.join(5)
+        assert not sniffer.is_alive()
+
+    def test_stops_when_transport_goes_away(self):
+        sniffer = Sniffer(FakeSniffTransport(), 0.01)
+        sniffer.start()
+        sniffer.join(5)
+        assert not sniffer.is_alive()
+
+    def test_get_es_sniff_interval(self):
+        es = get_es(sniff_interval=60, force_new=True)
+        sniffer = es.transport.sniffer
+        assert sniffer.is_alive()
+        eq_(sniffer.interval, 60)
+        sniffer.stop()
+
+
+class CircuitBreakerTest(TestCase):
+    def fail(self):
+        raise ConnectionError('N/A', 'refused', None)
+
+    def test_opens_after_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        for i in range(2):
+            self.assertRaises(ConnectionError, breaker.call, self.fail)
+        eq_(breaker.state, CircuitBreaker.OPEN)
+        assert breaker.is_open()
+
+        calls = []
+        self.assertRaises(CircuitOpenError, breaker.call, calls.append, 1)
+        eq_(calls, [])
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+        self.assertRaises(ConnectionError, breaker.call, self.fail)
+        eq_(breaker.call(lambda: 'ok'), 'ok')
+        self.assertRaises(ConnectionError, breaker.call, self.fail)
+        eq_(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_other_errors_dont_count(self):
+        breaker = CircuitBreaker(failure_threshold=1)
+
+        def not_found():
+            raise NotFoundError(404, 'missing')
+
+        self.assertRaises(NotFoundError, breaker.call, not_found)
+        eq_(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        self.assertRaises(ConnectionError, breaker.call, self.fail)
+        breaker.opened_at -= 30
+        assert not breaker.is_open()
+
+        # One probe at a time.
+        eq_(breaker.allow_request(), True)
+        eq_(breaker.state, CircuitBreaker.HALF_OPEN)
+        eq_(breaker.allow_request(), False)
+        assert breaker.is_open()
+
+        # A failed probe opens it again.
+        breaker.record_failure()
+        eq_(breaker.state, CircuitBreaker.OPEN)
+
+        breaker.opened_at -= 30
+        eq_(breaker.call(lambda: 'ok'), 'ok')
+        eq_(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_get_circuit_breaker(self):
+        breaker = get_circuit_breaker(['http://example.com:9201'],
+                                      failure_threshold=3)
+        eq_(breaker.failure_threshold, 3)
+        assert get_circuit_breaker('http://example.com:9201') is breaker
+        assert get_circuit_breaker(['http://example.com:9202']) is not breaker
+
+    def test_get_es(self):
+        breaker = CircuitBreaker(failure_threshold=1)
+        # Nothing listens on port 1.
+        es = get_es(urls=['127.0.0.1:1'], circuit_breaker=breaker,
+                    max_retries=0, force_new=True)
+        assert isinstance(es.transport, CircuitBreakerTransport)
+        connection = es.transport.connection_pool.connections[0]
+        self.assertRaises(ConnectionError, es.info)
+        eq_(breaker.state, CircuitBreaker.OPEN)
+
+        num_requests = connection.num_requests
+        self.assertRaises(CircuitOpenError, es.info)
+        eq_(connection.num_requests, num_requests)
+
+
+class FakeSearchES(object):
+    def __init__(self):
+        self.calls = []
+
+    def search(self, **kwargs):
+        self.calls.append(kwargs)
+        return {'took': 1, 'hits': {'total': 3, 'hits': []}}
+
+    def mlt(self, **kwargs):
+        self.calls.append(kwargs)
+        return {'took': 1, 'hits': {'total': 0, 'hits': []}}
+
+
+class FakeResponse(object):
+    status = 200
+    data = '{}'
+
+    def getheaders(self):
+        return {}
+
+
+class FakeStreamResponse(object):
+    def __init__(self, status, chunks):
+        self.status = status
+        self.chunks = chunks
+
+    @property
+    def data(self):
+        return ''.join(self.chunks)
+
+    def stream(self, chunk_size):
+        return iter(self.chunks)
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+class DeadlineTest(TestCase):
+    def test_remaining_time(self):
+        eq_(get_remaining_time(), None)
+        with deadline(10):
+            remaining = get_remaining_time()
+            assert 9 < remaining <= 10
+
+            # Nested deadlines can't extend the budget.
+            with deadline(20):
+                assert get_remaining_time() <= remaining
+            with deadline(1):
+                assert get_remaining_time() <= 1
+            assert get_remaining_time() > 1
+        eq_(get_remaining_time(), None)
+
+    def test_exceeded(self):
+        with deadline(0):
+            self.assertRaises(DeadlineExceeded, get_remaining_time)
+
+    def test_thread_local(self):
+        remaining = []
+        with deadline(0):
+            thread = threading.Thread(
+                target=lambda: remaining.append(get_remaining_time()))
+            thread.start()
+            thread.join()
+        eq_(remaining, [None])
+
+    def test_search_timeout(self):
+        es = FakeSearchES()
+        s = S().indexes('test')
+        s._es = (_get_owner(), es)
+        with deadline(0.5):
+            s.count()
+        assert es.calls[0]['timeout'].endswith('ms')
+        assert 0 < int(es.calls[0]['timeout'][:-2]) <= 500
+
+        # No deadline, no timeout.
+        s = S().indexes('test')
+        s._es = (_get_owner(), es)
+        s.count()
+        assert 'timeout' not in es.calls[1]
+
+    def test_search_after_deadline(self):
+        es = FakeSearchES()
+        s = S().indexes('test')
+        s._es = (_get_owner(), es)
+        with deadline(0):
+            self.assertRaises(DeadlineExceeded, s.count)
+            self.assertRaises(DeadlineExceeded, s.execute)
+        eq_(es.calls, [])
+
+    def test_mlt_timeout(self):
+        es = FakeSearchES()
+        with deadline(0.5):
+            MLT(1, index='test', doctype='doc', es=es).raw()
+        assert es.calls[0]['body']['timeout'].endswith('ms')
+
+    def test_http_timeout(self):
+        connection = HttpConnection()
+        timeouts = []
+
+        def urlopen(method, url, body, **kw):
+            timeouts.append(kw.get('timeout'))
+            return FakeResponse()
+
+        connection.pool.urlopen = urlopen
+        with deadline(0.5):
+            connection.perform_request('GET', '/')
+        assert 0 < timeouts[0] <= 0.5
+
+        with deadline(0):
+            self.assertRaises(DeadlineExceeded, connection.perform_request,
+                              'GET', '/')
+        eq_(len(timeouts), 1)
+        eq_(connection.num_requests, 1)
+
+    def test_timeout_after_deadline_isnt_connection_error(self):
+        connection = HttpConnection()
+
+        def urlopen(method, url, body, **kw):
+            time.sleep(0.02)
+            raise Exception('timed out')
+
+        connection.pool.urlopen = urlopen
+        with deadline(0.01):
+            self.assertRaises(DeadlineExceeded, connection.perform_request,
+                              'GET', '/')
+
+
+class CompressionTest(TestCase):
+    def gunzip(self, body):
+        return gzip.GzipFile(fileobj=StringIO(body)).read()
+
+    def test_off_by_default(self):
+        connection = HttpConnection()
+        assert 'Accept-Encoding' not in connection.pool.headers
+        eq_(connection.prepare_body('x' * 2000), ('x' * 2000, None))
+
+    def test_prepare_body(self):
+        connection = HttpConnection(compress=True, compress_threshold=100)
+        eq_(connection.pool.headers['Accept-Encoding'], 'gzip')
+
+        # Small bodies aren't worth compressing.
+        eq_(connection.prepare_body('x' * 10), ('x' * 10, None))
+
+        body, headers = connection.prepare_body(u'x' * 200)
+        eq_(headers['Content-Encoding'], 'gzip')
+        eq_(headers['Accept-Encoding'], 'gzip')
+        eq_(self.gunzip(body), 'x' * 200)
+        assert len(body) < 200
+
+    def test_perform_request(self):
+        connection = HttpConnection(compress=True, compress_threshold=100)
+        calls = []
+
+        def urlopen(method, url, body, **kw):
+            calls.append((body, kw.get('headers')))
+            return FakeResponse()
+
+        connection.pool.urlopen = urlopen
+        connection.perform_request('POST', '/_search', body='x' * 200)
+        connection.perform_request('POST', '/_search', body='x')
+        eq_(self.gunzip(calls[0][0]), 'x' * 200)
+        eq_(calls[0][1]['Content-Encoding'], 'gzip')
+        eq_(calls[1], ('x', None))
+
+    def test_get_es(self):
+        es = get_es(compress=True, compress_level=1, force_new=True)
+        connection = es.transport.connection_pool.connections[0]
+        eq_(connection.compress, True)
+        eq_(connection.compress_level, 1)
+
+
+class FakeHub(object):
+    pass
+
+
+class FakeGevent(object):
+    def __init__(self):
+        self.patched = True
+        self.hub = FakeHub()
+
+    def is_module_patched(self, name):
+        return self.patched and name == 'socket'
+
+    def get_hub(self):
+        return self.hub
+
+
+class CooperativeTest(TestCase):
+    def setUp(self):
+        super(CooperativeTest, self).setUp()
+        self.gevent = FakeGevent()
+        self.old_modules = dict(sys.modules)
+        sys.modules['gevent'] = sys.modules['gevent.monkey'] = self.gevent
+        evict_es()
+
+    def tearDown(self):
+        sys.modules.clear()
+        sys.modules.update(self.old_modules)
+        evict_es()
+        super(CooperativeTest, self).tearDown()
+
+    def get_connection(self, es):
+        return es.transport.connection_pool.connections[0]
+
+    def test_pool_settings(self):
+        connection = self.get_connection(get_es())
+        eq_(connection.maxsize, elasticutils.COOPERATIVE_POOL_MAXSIZE)
+        eq_(connection.pool.block, True)
+
+        connection = self.get_connection(get_es(maxsize=5, block=False))
+        eq_(connection.maxsize, 5)
+        eq_(connection.pool.block, False)
+
+    def test_cache_per_hub(self):
+        es = get_es()
+        assert get_es() is es
+
+        self.gevent.hub = FakeHub()
+        es2 = get_es()
+        assert es2 is not es
+        assert get_es() is es2
+
+    def test_not_patched(self):
+        self.gevent.patched = False
+        connection = self.get_connection(get_es())
+        eq_(connection.pool.block, False)
+        self.assertRaises(ValueError, get_es, cooperative=True)
+
+    def test_turned_off(self):
+        connection = self.get_connection(get_es(cooperative=False))
+        eq_(connection.pool.block, False)
+
+
+class FakeWarmUpS(object):
+    def __init__(self, error=None):
+        self.error = error
+        self.executed = False
+
+    def execute(self):
+        self.executed = True
+        if self.error:
+            raise self.error
+
+
+class WarmUpTest(TestCase):
+    def setUp(self):
+        super(WarmUpTest, self).setUp()
+        # Connecting works without anything accepting; the connections
+        # wait in the backlog.
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(10)
+        self.url = '127.0.0.1:{0}'.format(self.server.getsockname()[1])
+
+    def tearDown(self):
+        self.server.close()
+        super(WarmUpTest, self).tearDown()
+
+    def test_opens_connections(self):
+        es = get_es(urls=[self.url], maxsize=3, force_new=True)
+        eq_(warm_up(es, connections=2), 2)
+        stats = get_pool_stats(es)[0]
+        eq_(stats['idle'], 2)
+        eq_(stats['connections_created'], 2)
+
+        # Connections that are already open aren't opened again and
+        # there are never more than maxsize.
+        eq_(warm_up(es, connections=10), 1)
+        eq_(get_pool_stats(es)[0]['connections_created'], 3)
+
+    def test_errors_are_logged(self):
+        self.server.close()
+        es = get_es(urls=[self.url], force_new=True)
+        eq_(warm_up(es), 0)
+
+    def test_queries(self):
+        queries = [FakeWarmUpS(error=TransportError(500, 'boom')),
+                   FakeWarmUpS()]
+        es = get_es(urls=[self.url], force_new=True)
+        warm_up(es, queries=queries)
+        assert queries[0].executed
+        assert queries[1].executed
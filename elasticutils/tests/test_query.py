@@ -35,6 +35,28 @@ class STest(TestCase):
     def test_typed_s_get_doctypes(self):
         eq_(S(FakeMappingType).get_doctypes(), ['doctype123'])
 
+    def test_only(self):
+        eq_(S().only('id', 'title')._build_query(),
+            {'_source': {'include': ['id', 'title']}})
+
+        # Later calls overwrite earlier ones.
+        eq_(S().only('id').only('title')._build_query(),
+            {'_source': {'include': ['title']}})
+
+        # No arguments fetches everything again.
+        eq_(S().only('id').only()._build_query(), {})
+
+    def test_defer(self):
+        eq_(S().defer('body').defer('summary_*')._build_query(),
+            {'_source': {'exclude': ['body', 'summary_*']}})
+
+        eq_(S().defer('body').defer(None)._build_query(), {})
+
+    def test_only_and_defer(self):
+        eq_(S().only('author.*').defer('author.email')._build_query(),
+            {'_source': {'include': ['author.*'],
+                         'exclude': ['author.email']}})
+
 
 class QTest(TestCase):
     def test_q_should(self):
@@ -1,8 +1,16 @@
+import copy
+import json
+import sys
 from datetime import date, datetime
+from unittest import TestCase
 
+from elasticsearch.exceptions import NotFoundError, RequestError
+from elasticsearch.serializer import JSONSerializer
 from nose.tools import eq_
 
-from elasticutils import S, DefaultMappingType, NoModelError, MappingType
+from elasticutils import (
+    S, DefaultMappingType, NoModelError, MappingType, ObjectSearchResults,
+    get_mapping_type, register_mapping_type, _mapping_types)
 from elasticutils.tests import ESTestCase
 
 
@@ -47,10 +55,662 @@ class FakeMappingType(MappingType):
     def get_mapping_type_name(cls):
         return 'elasticutilsdoctypefmt'
 
-    def get_model(self):
+    @classmethod
+    def get_model(cls):
         return FakeModel
 
 
+def make_response(hits):
+    return {
+        'took': 1,
+        'hits': {
+            'total': len(hits),
+            'hits': hits
+        }
+    }
+
+
+class CountingManager(object):
+    """Manager that counts queries and matches ids like a database"""
+    def __init__(self):
+        self.query_count = 0
+
+    def filter(self, id__in=None):
+        self.query_count += 1
+        id__in = [int(id_) for id_ in id__in]
+        return [m for m in model_cache if m.id in id__in]
+
+
+def get_objects_by_id(model, ids):
+    return dict((unicode(obj.id), obj)
+                for obj in model.objects.filter(id__in=ids))
+
+
+class FakeModelMappingType(FakeMappingType):
+    @classmethod
+    def get_objects(cls, ids):
+        # One query for all of them, like the Django MappingType.
+        return get_objects_by_id(cls.get_model(), ids)
+
+
+class ToQuerysetTest(TestCase):
+    def setUp(self):
+        super(ToQuerysetTest, self).setUp()
+        for id_ in (1, 2, 3):
+            FakeModel(id=id_)
+        FakeModel.objects = CountingManager()
+
+    def tearDown(self):
+        FakeModel.objects = Manager()
+        reset_model_cache()
+        super(ToQuerysetTest, self).tearDown()
+
+    def make_results(self, ids):
+        hits = [{'_id': unicode(id_), '_source': {'id': id_}} for id_ in ids]
+        return ObjectSearchResults(
+            FakeModelMappingType, make_response(hits), hits, None)
+
+    def test_results_to_queryset_keeps_order(self):
+        results = self.make_results([3, 1, 2])
+        eq_([obj.id for obj in results.to_queryset()], [3, 1, 2])
+        eq_(FakeModel.objects.query_count, 1)
+
+    def test_results_to_queryset_skips_missing(self):
+        results = self.make_results([4, 2])
+        eq_([obj.id for obj in results.to_queryset()], [2])
+
+    def test_s_to_queryset_uses_results_cache(self):
+        class NoSearchS(S):
+            def raw(self):
+                raise AssertionError('to_queryset should not search')
+
+        s = NoSearchS(FakeModelMappingType)
+        s._results_cache = self.make_results([2, 3, 1])
+        eq_([obj.id for obj in s.to_queryset()], [2, 3, 1])
+        eq_(FakeModel.objects.query_count, 1)
+
+    def test_s_to_queryset_empty(self):
+        s = S(FakeModelMappingType)
+        s._results_cache = self.make_results([])
+        eq_(s.to_queryset(), [])
+        eq_(FakeModel.objects.query_count, 0)
+
+
+class FakeMgetES(object):
+    """Elasticsearch stand-in that serves mget from a dict of sources"""
+    def __init__(self, sources):
+        self.sources = sources
+        self.mget_count = 0
+
+    def mget(self, body):
+        self.mget_count += 1
+        return {'docs': [{'_id': doc['_id'],
+                          '_source': self.sources[doc['_id']]}
+                         for doc in body['docs']]}
+
+
+class FakeSearchS(S):
+    """S that returns a canned search response"""
+    def __init__(self, type_=None, es=None, response=None):
+        super(FakeSearchS, self).__init__(type_)
+        self.fake_es = es
+        self.response = response
+
+    def _clone(self, next_step=None):
+        new = super(FakeSearchS, self)._clone(next_step)
+        new.fake_es = self.fake_es
+        new.response = self.response
+        return new
+
+    def get_es(self, default_builder=None):
+        return self.fake_es
+
+    def raw(self):
+        self._build_query()
+        return copy.deepcopy(self.response)
+
+    def raw_stream(self, response):
+        if self.response is not None:
+            raise AssertionError('streamed search with a canned response')
+        return super(FakeSearchS, self).raw_stream(response)
+
+
+class DeferredFieldsTest(TestCase):
+    def setUp(self):
+        super(DeferredFieldsTest, self).setUp()
+        sources = {
+            u'1': {'id': 1, 'title': 'one', 'body': 'first body'},
+            u'2': {'id': 2, 'title': 'two', 'body': 'second body'},
+        }
+        self.es = FakeMgetES(sources)
+        hits = [{'_index': 'test', '_type': 'doc', '_id': id_,
+                 '_source': {'id': sources[id_]['id'],
+                             'title': sources[id_]['title']}}
+                for id_ in sorted(sources)]
+        self.s = FakeSearchS(es=self.es, response=make_response(hits))
+
+    def test_deferred_fields_not_fetched_by_default(self):
+        results = list(self.s.defer('body'))
+        self.assertRaises(AttributeError, lambda: results[0].body)
+        eq_(self.es.mget_count, 0)
+
+    def test_fetch_deferred(self):
+        results = list(self.s.defer('body').fetch_deferred())
+        eq_(results[0].title, 'one')
+        eq_(self.es.mget_count, 0)
+
+        # The first deferred access fetches for all the results.
+        eq_(results[1].body, 'second body')
+        eq_(results[0]['body'], 'first body')
+        eq_(self.es.mget_count, 1)
+
+    def test_fetch_deferred_with_only(self):
+        results = list(self.s.only('id', 'title').fetch_deferred())
+        eq_(results[0].body, 'first body')
+        eq_(self.es.mget_count, 1)
+
+        # Fields that aren't in the document still raise.
+        self.assertRaises(AttributeError, lambda: results[0].doesnt_exist)
+        eq_(self.es.mget_count, 1)
+
+
+class FakeConnection(object):
+    """Connection without a urllib3 pool that returns a canned body"""
+    def __init__(self, body):
+        self.body = body
+        self.requests = []
+
+    def perform_request(self, method, url, params=None, body=None):
+        self.requests.append((method, url))
+        return 200, {}, self.body
+
+
+class FakeTransport(object):
+    send_get_body_as = 'GET'
+    max_retries = 0
+
+    def __init__(self, connection):
+        self.serializer = JSONSerializer()
+        self.connection = connection
+        self.connection_pool = self
+
+    def get_connection(self):
+        return self.connection
+
+    def mark_live(self, connection):
+        pass
+
+
+class FakeStreamES(object):
+    def __init__(self, body):
+        self.transport = FakeTransport(FakeConnection(body))
+
+
+class StreamTest(TestCase):
+    response = make_response([
+        {'_index': 'test', '_type': 'doc', '_id': '1', '_score': 1.0,
+         '_source': {'id': 1, 'tag': 'awesome', 'created': '2013-11-01'}},
+        {'_index': 'test', '_type': 'doc', '_id': '2', '_score': 0.5,
+         '_source': {'id': 2, 'tag': 'boring', 'created': '2013-11-02'}},
+    ])
+    response['facets'] = {
+        'tag': {'_type': 'terms', 'terms': [{'term': 'awesome', 'count': 1},
+                                            {'term': 'boring', 'count': 1}]}
+    }
+
+    def get_s(self):
+        es = FakeStreamES(json.dumps(self.response))
+        return FakeSearchS(es=es).indexes('test').doctypes('doc').stream()
+
+    def test_stream(self):
+        s = self.get_s()
+        results = s.execute()
+        eq_([obj.id for obj in results], [1, 2])
+        eq_(results.objects[0].created, datetime(2013, 11, 1))
+        eq_(results.count, 2)
+        eq_(results.took, 1)
+        eq_(results.results, None)
+        eq_(s.facet_counts()['tag'][0], {'term': 'awesome', 'count': 1})
+        eq_(s.fake_es.transport.connection.requests,
+            [('GET', '/test/doc/_search')])
+
+    def test_stream_values_dict(self):
+        results = list(self.get_s().values_dict())
+        eq_(results[1]['tag'], 'boring')
+        eq_(results[1]._id, '2')
+
+
+class FakePagedConnection(FakeConnection):
+    """Connection that returns a different canned body per request"""
+    def perform_request(self, method, url, params=None, body=None):
+        self.requests.append((method, url, params, body))
+        return 200, {}, self.body.pop(0)
+
+
+class FakeIdsES(object):
+    """Elasticsearch stand-in for searches and scrolls of ids"""
+    def __init__(self, response, pages=()):
+        self.response = response
+        self.searches = []
+        self.cleared = []
+        self.transport = FakeTransport(
+            FakePagedConnection([json.dumps(page) for page in pages]))
+
+    def search(self, body, index, doc_type, **params):
+        self.searches.append((body, params))
+        return copy.deepcopy(self.response)
+
+    def clear_scroll(self, scroll_id):
+        self.cleared.append(scroll_id)
+
+
+class IdsTest(TestCase):
+    def setUp(self):
+        super(IdsTest, self).setUp()
+        for id_ in (1, 2, 3):
+            FakeModel(id=id_)
+        FakeModel.objects = CountingManager()
+
+    def tearDown(self):
+        FakeModel.objects = Manager()
+        reset_model_cache()
+        super(IdsTest, self).tearDown()
+
+    def test_ids(self):
+        es = FakeIdsES(make_response([{'_id': '2'}, {'_id': '1'}]))
+        s = FakeSearchS(es=es).query(foo='bar').facet('tag').only('title')
+        eq_(s[:10].ids(), ['2', '1'])
+
+        body, params = es.searches[0]
+        assert '_source' not in body
+        eq_(body['fields'], [])
+        eq_(body['size'], 10)
+        assert 'query' in body
+        assert 'facets' not in body
+
+    def test_to_queryset_uses_ids(self):
+        es = FakeIdsES(make_response([{'_id': '3'}, {'_id': '1'}]))
+        s = FakeSearchS(FakeModelMappingType, es=es)
+        eq_([obj.id for obj in s.to_queryset()], [3, 1])
+        eq_(FakeModel.objects.query_count, 1)
+        eq_(es.searches[0][0]['fields'], [])
+
+    def test_iter_ids(self):
+        pages = [
+            dict(make_response([{'_id': '1'}, {'_id': '2'}]),
+                 _scroll_id='scroll2'),
+            dict(make_response([{'_id': '3'}]), _scroll_id='scroll3'),
+            dict(make_response([]), _scroll_id='scroll4'),
+        ]
+        es = FakeIdsES(dict(make_response([]), _scroll_id='scroll1'),
+                       pages)
+        s = FakeSearchS(es=es).order_by('id')
+        eq_(list(s[:1].iter_ids(size=2)), ['1', '2', '3'])
+
+        body, params = es.searches[0]
+        eq_(params, {'search_type': 'scan', 'scroll': '1m', 'size': 2})
+        assert 'sort' not in body
+        assert 'size' not in body
+
+        requests = es.transport.connection.requests
+        eq_([request[3] for request in requests],
+            ['scroll1', 'scroll2', 'scroll3'])
+        eq_(requests[0][:3], ('POST', '/_search/scroll', {'scroll': '1m'}))
+        eq_(es.cleared, ['scroll4'])
+
+    def test_iter_ids_clears_scroll_when_closed(self):
+        pages = [dict(make_response([{'_id': '1'}, {'_id': '2'}]),
+                      _scroll_id='scroll2')]
+        es = FakeIdsES(dict(make_response([]), _scroll_id='scroll1'),
+                       pages)
+        ids = FakeSearchS(es=es).iter_ids()
+        eq_(next(ids), '1')
+        ids.close()
+        eq_(es.cleared, ['scroll1'])
+
+
+class FakeOldClusterES(FakeIdsES):
+    """Elasticsearch stand-in that doesn't support terminate_after"""
+    def search(self, body, index, doc_type, **params):
+        if 'terminate_after' in body:
+            self.searches.append((body, params))
+            raise RequestError(
+                400, 'SearchPhaseExecutionException[Failed to execute '
+                'phase [query]; nested: SearchParseException[Parse '
+                'Failure [No parser for element [terminate_after]]]; ]')
+        return super(FakeOldClusterES, self).search(
+            body, index, doc_type, **params)
+
+
+class BoundedCountTest(TestCase):
+    def test_exists(self):
+        es = FakeIdsES(make_response([{'_id': '1'}]))
+        s = FakeSearchS(es=es).query(foo='bar').order_by('-id')
+        eq_(s.exists(), True)
+
+        body, params = es.searches[0]
+        eq_(body['size'], 0)
+        eq_(body['terminate_after'], 1)
+        assert 'constant_score' in body['query']
+        assert 'sort' not in body
+
+    def test_not_exists(self):
+        es = FakeIdsES(make_response([]))
+        eq_(FakeSearchS(es=es).exists(), False)
+
+    def test_count_upper_bound(self):
+        response = make_response([])
+        response['hits']['total'] = 1000
+        es = FakeIdsES(response)
+        s = FakeSearchS(es=es).facet('tag')
+        eq_(s.count(upper_bound=100), 100)
+        eq_(s.count(upper_bound=5000), 1000)
+
+        body, params = es.searches[0]
+        eq_(body['size'], 0)
+        eq_(body['terminate_after'], 100)
+        assert 'facets' not in body
+
+    def test_fallback_without_terminate_after(self):
+        response = make_response([])
+        response['hits']['total'] = 1000
+        es = FakeOldClusterES(response)
+        s = FakeSearchS(es=es)
+        eq_(s.count(upper_bound=100), 100)
+        eq_(s.exists(), True)
+        eq_([body.get('terminate_after') for body, params in es.searches],
+            [100, None, None])
+        eq_(es.searches[-1][0]['size'], 1)
+
+    def test_other_errors_raised(self):
+        class MissingIndexES(FakeIdsES):
+            def search(self, body, index, doc_type, **params):
+                self.searches.append((body, params))
+                raise NotFoundError(404, 'IndexMissingException[[test] '
+                                    'missing]')
+
+        es = MissingIndexES(make_response([]))
+        s = FakeSearchS(es=es)
+        self.assertRaises(NotFoundError, s.count, upper_bound=100)
+        self.assertRaises(NotFoundError, s.exists)
+        # terminate_after is still used.
+        eq_([body.get('terminate_after') for body, params in es.searches],
+            [100, 1])
+
+    def test_uses_results_cache(self):
+        es = FakeIdsES(None)
+        s = FakeSearchS(es=es)
+        s._results_cache = ObjectSearchResults(
+            None, make_response([{'_id': '1', '_source': {}}]),
+            [{'_id': '1', '_source': {}}], None)
+        eq_(s.exists(), True)
+        eq_(s.count(upper_bound=10), 1)
+        eq_(es.searches, [])
+
+
+def reachable_size(obj, seen=None):
+    """Returns the bytes used by obj and everything it refers to"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += reachable_size(key, seen) + reachable_size(value, seen)
+    elif isinstance(obj, (list, tuple)):
+        for item in obj:
+            size += reachable_size(item, seen)
+    if hasattr(obj, '__dict__'):
+        size += reachable_size(obj.__dict__, seen)
+    return size
+
+
+class LeanTest(TestCase):
+    def get_s(self):
+        response = make_response([
+            {'_id': '1', '_source': {'id': 1, 'tag': 'awesome'}},
+            {'_id': '2', '_source': {'id': 2, 'tag': 'boring'}},
+        ])
+        response['facets'] = {
+            'tag': {'_type': 'terms', 'terms': [{'term': 'awesome',
+                                                 'count': 1}]}
+        }
+        return FakeSearchS(response=response)
+
+    def test_default_keeps_response(self):
+        results = self.get_s().execute()
+        assert results.response is not None
+        eq_(len(results.results), 2)
+
+    def test_lean(self):
+        s = self.get_s().lean()
+        results = s.execute()
+        eq_(results.response, None)
+        eq_(results.results, None)
+        eq_([obj.id for obj in results], [1, 2])
+        eq_(results.count, 2)
+        eq_(results.took, 1)
+        eq_(s.facet_counts(), {'tag': [{'term': 'awesome', 'count': 1}]})
+
+    def test_lean_values_dict(self):
+        results = self.get_s().lean().values_dict().execute()
+        eq_(results.response, None)
+        eq_(list(results), [{'id': 1, 'tag': 'awesome'},
+                            {'id': 2, 'tag': 'boring'}])
+        eq_([obj._source for obj in results], [None, None])
+
+    def test_lean_uses_less_memory(self):
+        s = FakeSearchS(response=make_response([
+            {'_id': str(i), '_index': 'test', '_type': 'doc', '_score': 1.0,
+             '_source': dict(('field{0}'.format(j), j) for j in range(20))}
+            for i in range(100)]))
+
+        # Mapping type instances are built on the _source, but dicts
+        # and tuples are copies, so they don't need it.
+        for s in (s.values_dict(), s.values_list()):
+            full = reachable_size(s.execute().objects)
+            lean = reachable_size(s.lean().execute().objects)
+            assert lean < full * 0.85, (lean, full)
+
+
+class ValuesListNoFieldsTest(TestCase):
+    hits = [
+        {'_id': '1', '_source': {'id': 1, 'name': 'odin', 'tag': 'a'}},
+        {'_id': '2', '_source': {'tag': 'b', 'id': 2, 'extra': 'x'}},
+    ]
+
+    def get_s(self, type_=None):
+        return FakeSearchS(type_, response=make_response(self.hits))
+
+    def test_first_hit_order(self):
+        results = self.get_s().values_list().execute()
+        eq_(list(results), [(1, 'odin', 'a'), (2, None, 'b')])
+        eq_(results.fields, ['id', 'name', 'tag'])
+
+    def test_mapping_order(self):
+        class MappedMappingType(FakeMappingType):
+            @classmethod
+            def get_mapping(cls):
+                return {'properties': {'tag': {}, 'id': {}, 'extra': {}}}
+
+        results = self.get_s(MappedMappingType).values_list().execute()
+        eq_(list(results), [(None, 1, 'a'), ('x', 2, 'b')])
+        eq_(results.fields, ['extra', 'id', 'tag'])
+
+    def test_no_hits(self):
+        results = FakeSearchS(response=make_response([])).values_list()
+        eq_(list(results), [])
+
+
+class FieldAccessorTest(TestCase):
+    def get_mapping_type(self):
+        class MappedMappingType(MappingType):
+            @classmethod
+            def get_mapping(cls):
+                return {'properties': {'title': {}, 'body': {},
+                                       'get_index': {}, 'object': {}}}
+
+            def get_object(self):
+                return 'the object'
+
+        return MappedMappingType
+
+    def test_accessors_added_once(self):
+        mapping_type = self.get_mapping_type()
+        assert 'title' not in mapping_type.__dict__
+
+        obj = mapping_type.from_results({'title': 'one', 'body': 'two'})
+        accessor = mapping_type.__dict__['title']
+        eq_(sorted(mapping_type._field_accessors), ['body', 'title'])
+        eq_(obj.title, 'one')
+        eq_(obj.body, 'two')
+
+        mapping_type.from_results({})
+        assert mapping_type.__dict__['title'] is accessor
+
+    def test_existing_attributes_kept(self):
+        mapping_type = self.get_mapping_type()
+        obj = mapping_type.from_results({'get_index': 1, 'object': 2})
+        assert callable(obj.get_index)
+        eq_(obj.object, 'the object')
+
+    def test_fallbacks(self):
+        mapping_type = self.get_mapping_type()
+        obj = mapping_type.from_results({'other': 1})
+        # Undeclared fields still work.
+        eq_(obj.other, 1)
+        # Declared fields missing from the results go to __getattr__.
+        self.assertRaises(AttributeError, lambda: obj.title)
+        # Instance attributes take precedence.
+        obj.body = 'mine'
+        eq_(obj.body, 'mine')
+
+    def test_no_mapping(self):
+        obj = FakeMappingType.from_results({'title': 'one'})
+        eq_(obj.title, 'one')
+        eq_(FakeMappingType._field_accessors, [])
+
+
+class FakeOtherModel(FakeModel):
+    objects = CountingManager()
+
+
+class FakeOtherMappingType(MappingType):
+    @classmethod
+    def get_index(cls):
+        return 'elasticutilstestfmt'
+
+    @classmethod
+    def get_mapping_type_name(cls):
+        return 'elasticutilsdoctypeother'
+
+    @classmethod
+    def get_model(cls):
+        return FakeOtherModel
+
+    @classmethod
+    def get_objects(cls, ids):
+        return get_objects_by_id(cls.get_model(), ids)
+
+
+class MappingTypeRegistryTest(TestCase):
+    def setUp(self):
+        super(MappingTypeRegistryTest, self).setUp()
+        self.old_mapping_types = dict(_mapping_types)
+        register_mapping_type(FakeOtherMappingType)
+
+        FakeModel.objects = CountingManager()
+        FakeOtherModel.objects = CountingManager()
+
+    def tearDown(self):
+        _mapping_types.clear()
+        _mapping_types.update(self.old_mapping_types)
+        FakeModel.objects = Manager()
+        reset_model_cache()
+        super(MappingTypeRegistryTest, self).tearDown()
+
+    def get_results(self, mapping_type):
+        hits = [
+            {'_id': '1', '_type': 'elasticutilsdoctypefmt',
+             '_source': {'id': 1}},
+            {'_id': '2', '_type': 'elasticutilsdoctypeother',
+             '_source': {'id': 2}},
+            {'_id': '3', '_type': 'elasticutilsdoctypefmt',
+             '_source': {'id': 3}},
+            {'_id': '4', '_type': 'elasticutilsdoctypeother',
+             '_source': {'id': 4}},
+            {'_id': '5', '_type': 'unregistered', '_source': {'id': 5}},
+        ]
+        return ObjectSearchResults(
+            mapping_type, make_response(hits), hits, None)
+
+    def test_get_mapping_type(self):
+        eq_(get_mapping_type('elasticutilsdoctypeother'),
+            FakeOtherMappingType)
+        eq_(get_mapping_type('unregistered'), None)
+
+    def test_register_as_decorator(self):
+        @register_mapping_type
+        class DecoratedMappingType(FakeOtherMappingType):
+            @classmethod
+            def get_mapping_type_name(cls):
+                return 'decorated'
+
+        eq_(get_mapping_type('decorated'), DecoratedMappingType)
+
+    def test_untyped_results(self):
+        results = self.get_results(None)
+        eq_([obj.__class__ for obj in results],
+            [DefaultMappingType, FakeOtherMappingType, DefaultMappingType,
+             FakeOtherMappingType, DefaultMappingType])
+
+    def test_typed_results(self):
+        results = self.get_results(FakeModelMappingType)
+        eq_([obj.__class__ for obj in results],
+            [FakeModelMappingType, FakeOtherMappingType,
+             FakeModelMappingType, FakeOtherMappingType,
+             FakeModelMappingType])
+
+    def test_load_objects(self):
+        for id_ in (1, 3):
+            FakeModel(id=id_)
+        for id_ in (2, 4):
+            FakeOtherModel(id=id_)
+
+        results = self.get_results(FakeModelMappingType)
+        results.load_objects()
+
+        # One query per mapping type.
+        eq_(FakeModel.objects.query_count, 1)
+        eq_(FakeOtherModel.objects.query_count, 1)
+
+        objects = list(results)
+        eq_([obj.object.id for obj in objects[:4]], [1, 2, 3, 4])
+        assert isinstance(objects[1].object, FakeOtherModel)
+
+    def test_load_objects_uses_get_object(self):
+        class GetOnlyModel(object):
+            def __init__(self, id):
+                self.id = id
+
+            @classmethod
+            def get(cls, id):
+                return cls(int(id))
+
+        class GetOnlyMappingType(FakeMappingType):
+            def get_model(self):
+                return GetOnlyModel
+
+        hits = [{'_id': '1', '_source': {}}, {'_id': '2', '_source': {}}]
+        results = ObjectSearchResults(
+            GetOnlyMappingType, make_response(hits), hits, None)
+        results.load_objects()
+        eq_([obj.object.id for obj in results], [1, 2])
+
+
 class TestResultsWithData(ESTestCase):
     @classmethod
     def setup_class(cls):
@@ -89,12 +749,11 @@ class TestResultsWithData(ESTestCase):
         assert isinstance(searcher[0], dict)
 
     def test_values_list_no_fields(self):
-        """Specifying no fields with values_list defaults to ['id']."""
+        """Specifying no fields with values_list returns the _source."""
         searcher = list(self.get_s().query(foo='bar').values_list())
         assert isinstance(searcher[0], tuple)
-        # We sort the result and expected result here so that the
-        # order is stable and comparable.
-        eq_(sorted(searcher[0]), sorted((u'2', u'bar', u'awesome', 1)))
+        # Values are ordered by field name.
+        eq_(searcher[0], (u'bar', 1, u'awesome', u'2'))
 
     def test_values_list_results(self):
         """With values_list fields, returns list of tuples."""
@@ -1,8 +1,13 @@
+import json
 from unittest import TestCase
 
 from nose.tools import eq_
 
-from elasticutils.utils import chunked
+from elasticutils.utils import chunked, iter_search_hits, JSONStreamReader
+
+
+def split_text(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
 
 
 class ChunkedTests(TestCase):
@@ -19,3 +24,79 @@ class ChunkedTests(TestCase):
         # chunking list where len(list) > n
         eq_(list(chunked([1, 2, 3, 4, 5], 2)),
             [(1, 2), (3, 4), (5,)])
+
+
+class JSONStreamReaderTests(TestCase):
+    def test_read_values(self):
+        reader = JSONStreamReader(split_text(u' [1, "two", {"3": [4.5]}]', 2))
+        eq_(list(reader.iter_array()), [1, u'two', {u'3': [4.5]}])
+
+    def test_number_split_across_chunks(self):
+        reader = JSONStreamReader([u'[12', u'34, 5', u'6]'])
+        eq_(list(reader.iter_array()), [1234, 56])
+
+    def test_float_split_at_every_offset(self):
+        for text in (u'{"max_score": 0.5, "n": 1}',
+                     u'{"max_score": 1.5e+10, "n": 1}',
+                     u'{"max_score": -2E-3, "n": 1}'):
+            expected = json.loads(text)
+            for offset in range(1, len(text)):
+                reader = JSONStreamReader([text[:offset], text[offset:]])
+                got = {}
+                for key in reader.iter_object():
+                    got[key] = reader.read_value()
+                eq_(got, expected)
+
+    def test_empty_containers(self):
+        reader = JSONStreamReader([u'{ }'])
+        eq_(list(reader.iter_object()), [])
+
+        reader = JSONStreamReader([u'[', u' ]'])
+        eq_(list(reader.iter_array()), [])
+
+    def test_bad_json(self):
+        reader = JSONStreamReader([u'[1 2]'])
+        self.assertRaises(ValueError, list, reader.iter_array())
+
+        reader = JSONStreamReader([u'[1, '])
+        self.assertRaises(ValueError, list, reader.iter_array())
+
+
+class IterSearchHitsTests(TestCase):
+    response = {
+        u'took': 3,
+        u'timed_out': False,
+        u'_shards': {u'total': 5, u'successful': 5, u'failed': 0},
+        u'hits': {
+            u'total': 3,
+            u'max_score': 1.0,
+            u'hits': [
+                {u'_id': u'1', u'_score': 1.0,
+                 u'_source': {u'title': u'caf\xe9', u'tags': [u'a', u'b']}},
+                {u'_id': u'2', u'_score': 0.5, u'_source': {}},
+                {u'_id': u'3', u'_score': 0.25,
+                 u'_source': {u'body': u'x' * 1000}},
+            ]
+        },
+        u'facets': {
+            u'tags': {u'_type': u'terms', u'terms': [
+                {u'term': u'a', u'count': 1}]}
+        }
+    }
+
+    def test_iter_search_hits(self):
+        text = json.dumps(self.response)
+        for size in (1, 7, 100, len(text)):
+            meta = {}
+            hits = list(iter_search_hits(split_text(text, size), meta))
+            eq_(hits, self.response['hits']['hits'])
+
+            expected = dict(self.response)
+            expected['hits'] = dict(self.response['hits'], hits=[])
+            eq_(meta, expected)
+
+    def test_no_hits(self):
+        meta = {}
+        text = u'{"took": 1, "hits": {"total": 0, "hits": []}}'
+        eq_(list(iter_search_hits([text], meta)), [])
+        eq_(meta, {u'took': 1, u'hits': {u'total': 0, u'hits': []}})
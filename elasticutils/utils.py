@@ -1,3 +1,5 @@
+import json
+import re
 from itertools import islice
 
 
@@ -44,3 +46,168 @@ def format_explanation(explanation, indent='  ', indent_level=0):
         return line + '\n' + details
 
     return line
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_NUMBER_CHARS = re.compile(r'[0-9.eE+-]*')
+
+
+class JSONStreamReader(object):
+    """Reads JSON values one at a time from an iterable of text chunks
+
+    Only the part of the text that hasn't been read yet is kept
+    around, so reading a large document value by value doesn't need
+    the whole document in memory.
+
+    :arg chunks: iterable of unicode strings that together make up a
+        JSON document
+
+    """
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buf = u''
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size=1):
+        """Buffers at least size more characters if there are any
+
+        :returns: False if there was nothing left to buffer
+
+        """
+        pieces = [self.buf[self.pos:]]
+        have = len(pieces[0])
+        wanted = have + size
+        for chunk in self.chunks:
+            pieces.append(chunk)
+            have += len(chunk)
+            if have >= wanted:
+                break
+
+        self.buf = u''.join(pieces)
+        self.pos = 0
+        return len(pieces) > 1
+
+    def _skip_whitespace(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or not self._fill():
+                return
+
+    def _next_char(self):
+        self._skip_whitespace()
+        char = self.buf[self.pos:self.pos + 1]
+        self.pos += 1
+        return char
+
+    def _expect(self, expected):
+        char = self._next_char()
+        if char != expected:
+            raise ValueError('Expected %r, got %r' % (expected, char))
+
+    def read_value(self):
+        """Reads and returns the next complete JSON value"""
+        self._skip_whitespace()
+        while True:
+            pending = len(self.buf) - self.pos
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                # Most likely the value is cut off at the end of the
+                # buffer. Buffer at least as much again and retry so
+                # large values don't get parsed over and over.
+                if not self._fill(max(pending, 1)):
+                    raise
+                continue
+
+            # A number followed by nothing but number characters (like
+            # the '.' of '0.' or the 'e' of '1e') might continue in the
+            # next chunk, so raw_decode only got part of it.
+            if (isinstance(value, (int, long, float)) and
+                    _NUMBER_CHARS.match(self.buf, end).end() == len(self.buf)
+                    and self._fill()):
+                continue
+
+            self.pos = end
+            return value
+
+    def iter_object(self):
+        """Reads an object and yields its keys
+
+        The caller has to read the value for each key (with
+        ``read_value``, ``iter_object`` or ``iter_array``) before
+        getting the next key.
+
+        """
+        self._expect('{')
+        self._skip_whitespace()
+        if self.buf[self.pos:self.pos + 1] == '}':
+            self.pos += 1
+            return
+
+        while True:
+            key = self.read_value()
+            self._expect(':')
+            yield key
+
+            char = self._next_char()
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError('Expected "," or "}", got %r' % char)
+
+    def iter_array(self):
+        """Reads an array and yields its items one at a time"""
+        self._expect('[')
+        self._skip_whitespace()
+        if self.buf[self.pos:self.pos + 1] == ']':
+            self.pos += 1
+            return
+
+        while True:
+            yield self.read_value()
+
+            char = self._next_char()
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError('Expected "," or "]", got %r' % char)
+
+
+def iter_search_hits(chunks, response):
+    """Parses a search response incrementally and yields the hits
+
+    Everything in the response other than the hits themselves (took,
+    ``hits.total``, facets, ...) gets put in `response` as it's
+    parsed. ``response['hits']['hits']`` is left as an empty list.
+    Facets come after the hits in the response, so `response` is only
+    complete once all the hits have been consumed.
+
+    :arg chunks: iterable of unicode strings making up the response
+        body
+    :arg response: dict to put the rest of the response in
+
+    Example:
+
+    >>> response = {}
+    >>> list(iter_search_hits(['{"took": 2, "hits": {"total": 1, ',
+    ...                        '"hits": [{"_id": "1"}]}}'], response))
+    [{u'_id': u'1'}]
+    >>> response
+    {u'took': 2, u'hits': {u'total': 1, u'hits': []}}
+
+    """
+    reader = JSONStreamReader(chunks)
+    for key in reader.iter_object():
+        if key != 'hits':
+            response[key] = reader.read_value()
+            continue
+
+        hits = response[key] = {}
+        for hits_key in reader.iter_object():
+            if hits_key == 'hits':
+                hits[hits_key] = []
+                for hit in reader.iter_array():
+                    yield hit
+            else:
+                hits[hits_key] = reader.read_value()